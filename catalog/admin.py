@@ -2,7 +2,13 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Category, Product, ProductImage, Availability, Booking, News, MissingProduct
+from django.utils import timezone
+from .models import (
+    Category, Product, ProductImage, Availability, Booking, News, MissingProduct, OutboxEmail, CalendarFeedToken,
+)
+from .renditions import rendition_url
+from .booking_sync import record_deleted
+from .booking_events import notify_booking_change
 from django.db import models
 from ckeditor.widgets import CKEditorWidget
 
@@ -68,7 +74,7 @@ class NewsAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 150px; border-radius: 8px;" />',
-                obj.image.url
+                rendition_url(obj.image, 160)
             )
         return "Kein Bild"
     image_preview.short_description = "Vorschau"
@@ -95,7 +101,7 @@ class CategoryAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 50px; max-width: 50px;" />',
-                obj.image.url
+                rendition_url(obj.image, 160)
             )
         return "Kein Bild"
     image_preview.short_description = 'Vorschau'
@@ -117,7 +123,7 @@ class ProductImageAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 80px; max-width: 80px;" />',
-                obj.image.url
+                rendition_url(obj.image, 160)
             )
         return "Kein Bild"
     image_preview.short_description = 'Vorschau'
@@ -132,6 +138,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ['is_active', 'price']
     readonly_fields = ['image_preview', 'booking_count', 'image_count']
     inlines = [ProductImageInline]
+    actions = ['activate', 'deactivate']
     
     formfield_overrides = {
         models.TextField: {'widget': CKEditorWidget(config_name='product_description')},
@@ -159,11 +166,22 @@ class ProductAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 100px;" />',
-                obj.image.url
+                rendition_url(obj.image, 160)
             )
         return "Kein Bild"
     image_preview.short_description = 'Vorschau'
     
+    def activate(self, request, queryset):
+        # ProductQuerySet.update отмечает изменение каталога для счётчиков корзин
+        updated = queryset.update(is_active=True)
+        self.message_user(request, f'{updated} Produkte wurden aktiviert.')
+    activate.short_description = "Ausgewählte Produkte aktivieren"
+    
+    def deactivate(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        self.message_user(request, f'{updated} Produkte wurden deaktiviert.')
+    deactivate.short_description = "Ausgewählte Produkte deaktivieren"
+    
     def image_count(self, obj):
         count = obj.additional_images.count()
         if count > 0:
@@ -224,19 +242,80 @@ class BookingAdmin(admin.ModelAdmin):
     
     actions = ['confirm_bookings', 'cancel_bookings']
     
+    # update() не трогает auto_now, поэтому updated_at проставляем явно (ETag календарей)
     def confirm_bookings(self, request, queryset):
-        updated = queryset.update(status='confirmed')
+        bookings = list(queryset.only('id', 'product_id'))
+        updated = queryset.update(status='confirmed', updated_at=timezone.now())
+        notify_booking_change('updated', bookings)
         self.message_user(request, f'{updated} Buchungen wurden bestätigt.')
     confirm_bookings.short_description = "Ausgewählte Buchungen bestätigen"
     
     def cancel_bookings(self, request, queryset):
-        updated = queryset.update(status='cancelled')
+        bookings = list(queryset.only('id', 'product_id'))
+        updated = queryset.update(status='cancelled', updated_at=timezone.now())
+        notify_booking_change('updated', bookings)
         self.message_user(request, f'{updated} Buchungen wurden storniert.')
     cancel_bookings.short_description = "Ausgewählte Buchungen stornieren"
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        notify_booking_change('updated' if change else 'created', [obj])
+    
+    # Следы удалений нужны инкрементальной синхронизации календаря
+    def delete_model(self, request, obj):
+        record_deleted([obj])
+        notify_booking_change('deleted', [obj])
+        super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        bookings = list(queryset)
+        record_deleted(bookings)
+        notify_booking_change('deleted', bookings)
+        super().delete_queryset(request, queryset)
 
 # Регистрируем Booking с обновленным админом
 admin.site.register(Booking, BookingAdmin)
 
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'kind', 'recipients', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at', 'send_ms']
+    list_filter = ['status', 'kind']
+    search_fields = ['subject', 'to']
+    readonly_fields = ['created_at', 'sent_at', 'send_ms', 'attempts', 'last_error']
+    actions = ['retry_now']
+    
+    def recipients(self, obj):
+        return ', '.join(obj.to)
+    recipients.short_description = 'Empfänger'
+    
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} E-Mails werden erneut gesendet.')
+    retry_now.short_description = "Ausgewählte E-Mails erneut senden"
+
+@admin.register(CalendarFeedToken)
+class CalendarFeedTokenAdmin(admin.ModelAdmin):
+    list_display = ['user', 'token_prefix', 'created_at', 'last_used_at', 'revoked_at']
+    list_filter = ['revoked_at']
+    search_fields = ['user__username', 'user__email']
+    # Токены выдаются на странице бронирований; здесь только просмотр и отзыв
+    fields = ['user', 'token_prefix', 'created_at', 'last_used_at', 'revoked_at']
+    readonly_fields = fields
+    actions = ['revoke']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def token_prefix(self, obj):
+        return f"{obj.token[:6]}…"
+    token_prefix.short_description = 'Token'
+    
+    def revoke(self, request, queryset):
+        updated = queryset.filter(revoked_at__isnull=True).update(revoked_at=timezone.now())
+        self.message_user(request, f'{updated} Kalender-Links wurden widerrufen.')
+    revoke.short_description = "Ausgewählte Kalender-Links widerrufen"
+
 # Добавляем ссылку на страницу управления бронированиями в админ-панель
 # (без замены стандартного admin.site)
 
@@ -270,7 +349,7 @@ class MissingProductAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 100px;" />',
-                obj.image.url
+                rendition_url(obj.image, 160)
             )
         return "Kein Bild"
     image_preview.short_description = 'Vorschau'
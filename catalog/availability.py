@@ -0,0 +1,314 @@
+"""Движок доступности товаров.
+
+Брони и блокировки (Availability с is_available=False) сводятся в
+отсортированный список непересекающихся интервалов дат [start, end]
+(обе границы включительно). Все проверки делаются бинарным поиском,
+а в шаблон уходят компактные диапазоны вместо списка всех занятых дней.
+"""
+import hashlib
+from bisect import bisect_right
+from datetime import date, timedelta
+
+from django.db import connection
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, QuerySet
+
+from .models import Availability, Booking, Product
+
+# Статусы брони, которые делают товар недоступным
+BLOCKING_STATUSES = ('confirmed', 'pending')
+
+# Приоритет статусов, если в один день у товара несколько броней
+MATRIX_STATUS_PRIORITY = ('confirmed', 'pending', 'completed', 'cancelled')
+
+ONE_DAY = timedelta(days=1)
+
+
+def merge_intervals(intervals):
+    """Сортирует интервалы и склеивает пересекающиеся и соседние (день в день)"""
+    merged = []
+    for start, end in sorted(intervals):
+        if end < start:
+            continue
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class Occupancy:
+    """Занятость одного товара: отсортированные склеенные интервалы"""
+
+    def __init__(self, intervals=()):
+        self.intervals = merge_intervals(intervals)
+        self._starts = [start for start, _ in self.intervals]
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def _find(self, day):
+        """Индекс интервала, который может содержать day (или -1)"""
+        return bisect_right(self._starts, day) - 1
+
+    def is_free(self, day):
+        """Свободен ли товар в указанный день"""
+        i = self._find(day)
+        return i < 0 or self.intervals[i][1] < day
+
+    def is_range_free(self, start, end):
+        """Свободен ли товар во все дни с start по end включительно"""
+        if end < start:
+            start, end = end, start
+        i = self._find(end)
+        return i < 0 or self.intervals[i][1] < start
+
+    def next_free(self, day):
+        """Ближайший свободный день, начиная с day"""
+        i = self._find(day)
+        if i >= 0 and self.intervals[i][1] >= day:
+            # Интервалы склеены с соседями, поэтому следующий день после конца свободен
+            return self.intervals[i][1] + ONE_DAY
+        return day
+
+    def busy_ranges(self, start, end):
+        """Занятые интервалы, обрезанные по окну [start, end]"""
+        result = []
+        i = max(self._find(start), 0)
+        while i < len(self.intervals):
+            busy_start, busy_end = self.intervals[i]
+            if busy_start > end:
+                break
+            if busy_end >= start:
+                result.append((max(busy_start, start), min(busy_end, end)))
+            i += 1
+        return result
+
+    def free_ranges(self, start, end):
+        """Свободные интервалы внутри окна [start, end]"""
+        result = []
+        cursor = start
+        for busy_start, busy_end in self.busy_ranges(start, end):
+            if busy_start > cursor:
+                result.append((cursor, busy_start - ONE_DAY))
+            cursor = busy_end + ONE_DAY
+        if cursor <= end:
+            result.append((cursor, end))
+        return result
+
+    def as_ranges(self, start=None, end=None):
+        """Компактный вид для JSON: [["YYYY-MM-DD", "YYYY-MM-DD"], ...]"""
+        intervals = self.intervals if start is None or end is None else self.busy_ranges(start, end)
+        return [[busy_start.isoformat(), busy_end.isoformat()] for busy_start, busy_end in intervals]
+
+
+def occupied_querysets(product_id, start, end):
+    """Запросы броней и блокировок товара, пересекающих окно [start, end]: (start_date, end_date)"""
+    bookings = Booking.objects.filter(
+        product_id=product_id,
+        start_date__lte=end,
+        end_date__gte=start,
+        status__in=BLOCKING_STATUSES,
+    ).order_by().values_list('start_date', 'end_date')
+
+    blocks = Availability.objects.filter(
+        product_id=product_id,
+        start_date__lte=end,
+        end_date__gte=start,
+        is_available=False,
+    ).order_by().values_list('start_date', 'end_date')
+    return bookings, blocks
+
+
+def occupied_intervals(product_id, start, end):
+    """Сырые интервалы броней и блокировок товара, пересекающие окно [start, end]"""
+    bookings, blocks = occupied_querysets(product_id, start, end)
+    return list(bookings) + list(blocks)
+
+
+def get_occupancy(product_id, start, end):
+    """Занятость товара в окне [start, end] (интервалы обрезаются по окну)"""
+    occupancy = Occupancy(occupied_intervals(product_id, start, end))
+    return Occupancy(occupancy.busy_ranges(start, end))
+
+
+def filter_available(products, start, end):
+    """Оставляет товары без броней и блокировок в [start, end]
+
+    Один запрос: NOT EXISTS-подзапросы по индексам (product, end_date, start_date),
+    без проверок по каждому товару.
+    """
+    bookings = Booking.objects.filter(
+        product=OuterRef('pk'),
+        start_date__lte=end,
+        end_date__gte=start,
+        status__in=BLOCKING_STATUSES,
+    )
+    blocks = Availability.objects.filter(
+        product=OuterRef('pk'),
+        start_date__lte=end,
+        end_date__gte=start,
+        is_available=False,
+    )
+    return products.filter(~Exists(bookings), ~Exists(blocks))
+
+
+def range_conflicts_queryset(ranges):
+    """Брони и блокировки, пересекающие любой из непустого списка (product_id, start, end)"""
+    overlap = Q()
+    for product_id, start, end in ranges:
+        overlap |= Q(product_id=product_id, start_date__lte=end, end_date__gte=start)
+
+    bookings = Booking.objects.filter(overlap, status__in=BLOCKING_STATUSES)
+    blocks = Availability.objects.filter(overlap, is_available=False)
+    return bookings.order_by().values_list('product_id', 'start_date', 'end_date').union(
+        blocks.order_by().values_list('product_id', 'start_date', 'end_date'),
+        all=True,
+    )
+
+
+def find_range_conflicts(ranges):
+    """Занятые интервалы для каждого (product_id, start, end) из списка
+
+    Один запрос на весь список (брони UNION ALL блокировки по OR диапазонов).
+    Возвращает список той же длины: для каждого диапазона — слитые занятые
+    интервалы [(start, end), ...], пересекающие его; пустой список — свободно.
+    """
+    ranges = list(ranges)
+    if not ranges:
+        return []
+
+    busy = {}
+    for product_id, start, end in range_conflicts_queryset(ranges):
+        busy.setdefault(product_id, []).append((start, end))
+
+    return [
+        merge_intervals(
+            (busy_start, busy_end)
+            for busy_start, busy_end in busy.get(product_id, ())
+            if busy_start <= end and busy_end >= start
+        )
+        for product_id, start, end in ranges
+    ]
+
+
+def lock_product(product_id):
+    """Сериализует запись броней по товару; вызывать внутри transaction.atomic()
+
+    PostgreSQL блокирует строку товара через SELECT ... FOR UPDATE. SQLite не
+    умеет блокировать строки, поэтому холостой UPDATE сразу берёт блокировку
+    записи на всю базу — проверка пересечений и запись идут без гонки.
+    """
+    products = Product.objects.filter(id=product_id)
+    if connection.features.has_select_for_update:
+        return products.select_for_update().first()
+    # QuerySet.update напрямую: холостой UPDATE не меняет товар, версию каталога не трогаем
+    QuerySet.update(products, id=F('id'))
+    return products.first()
+
+
+def conflicts_queryset(product_id, start, end, exclude_id=None):
+    """id подтверждённых/ожидающих броней товара, пересекающих [start, end] (queryset)"""
+    bookings = Booking.objects.filter(
+        product_id=product_id,
+        start_date__lte=end,
+        end_date__gte=start,
+        status__in=BLOCKING_STATUSES,
+    )
+    if exclude_id is not None:
+        bookings = bookings.exclude(id=exclude_id)
+    return bookings.order_by('start_date').values_list('id', flat=True)
+
+
+def find_conflicts(product_id, start, end, exclude_id=None):
+    """id подтверждённых/ожидающих броней товара, пересекающих [start, end]"""
+    return list(conflicts_queryset(product_id, start, end, exclude_id))
+
+
+def month_window(year, month, months=1):
+    """Окно из months календарных месяцев, начиная с первого дня year-month"""
+    start = date(year, month, 1)
+    month_index = year * 12 + (month - 1) + months
+    end = date(month_index // 12, month_index % 12 + 1, 1) - ONE_DAY
+    return start, end
+
+
+def availability_version(product_slug):
+    """Версия занятости товара: (время последнего изменения броней и блокировок, ETag)
+
+    ETag учитывает и количество строк, чтобы удаление брони тоже меняло версию.
+    """
+    bookings = Booking.objects.filter(product__slug=product_slug).aggregate(
+        last_modified=Max('updated_at'),
+        count=Count('id'),
+    )
+    blocks = Availability.objects.filter(product__slug=product_slug).aggregate(
+        last_modified=Max('updated_at'),
+        count=Count('id'),
+    )
+    raw = (
+        f"{product_slug}:{bookings['last_modified']}:{bookings['count']}:"
+        f"{blocks['last_modified']}:{blocks['count']}"
+    )
+    last_modified = max(filter(None, (bookings['last_modified'], blocks['last_modified'])), default=None)
+    return last_modified, hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def run_length_encode(cells):
+    """[a, a, b, None] -> [[2, a], [1, b], [1, None]]"""
+    runs = []
+    for cell in cells:
+        if runs and runs[-1][1] == cell:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, cell])
+    return runs
+
+
+def matrix_bookings(start, end, statuses=MATRIX_STATUS_PRIORITY):
+    """Брони активных товаров в окне [start, end]: (product_id, start_date, end_date, status)"""
+    return Booking.objects.filter(
+        product__is_active=True,
+        start_date__lte=end,
+        end_date__gte=start,
+        status__in=statuses,
+    ).order_by().values_list('product_id', 'start_date', 'end_date', 'status')
+
+
+def occupancy_matrix(start, end, statuses=MATRIX_STATUS_PRIORITY):
+    """Матрица занятости: все активные товары × все дни окна [start, end]
+
+    Брони всех товаров выбираются одним запросом; по каждому товару дни
+    кодируются как RLE-пары [длина, статус или None].
+    """
+    days = (end - start).days + 1
+    priority = {status: rank for rank, status in enumerate(MATRIX_STATUS_PRIORITY)}
+
+    products = list(
+        Product.objects.filter(is_active=True).order_by('title').values_list('id', 'title')
+    )
+    cells = {product_id: [None] * days for product_id, _ in products}
+
+    for product_id, booking_start, booking_end, status in matrix_bookings(start, end, statuses):
+        row = cells[product_id]
+        rank = priority.get(status, len(priority))
+        first = (max(booking_start, start) - start).days
+        last = (min(booking_end, end) - start).days
+        for i in range(first, last + 1):
+            current = row[i]
+            if current is None or rank < priority.get(current, len(priority)):
+                row[i] = status
+
+    rows = []
+    for product_id, title in products:
+        row = cells[product_id]
+        rows.append({
+            'id': product_id,
+            'title': title,
+            'busy_days': days - row.count(None),
+            'runs': run_length_encode(row),
+        })
+    return rows
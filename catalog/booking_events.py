@@ -0,0 +1,115 @@
+"""Push-уведомления об изменениях броней для календарей администраторов.
+
+Изменения публикуются в хаб после коммита транзакции, а SSE-поток
+(catalog:booking_event_stream, только под ASGI) раздаёт их открытым календарям.
+Заодно сбрасывается кеш iCalendar-фидов (catalog.ics).
+Сообщение — только подсказка «что-то изменилось»: сами данные календарь
+забирает через инкрементальную синхронизацию (get_bookings_changes).
+
+Хаб по умолчанию живёт в памяти процесса. Для нескольких процессов или
+тестов его можно заменить своим классом с методами subscribe/unsubscribe/publish
+через настройку BOOKING_EVENTS_HUB = 'path.to.Hub'.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .ics import invalidate_feeds
+
+# Интервал комментариев-пингов, чтобы прокси не закрывали соединение
+HEARTBEAT_SECONDS = 15
+# Максимальная жизнь одного потока; EventSource переподключится сам
+STREAM_MAX_AGE_SECONDS = 300
+
+
+class InProcessHub:
+    """Рассылка в пределах одного процесса: у каждого подписчика своя asyncio-очередь"""
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self):
+        """Вызывать из event loop; возвращает очередь сообщений"""
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def publish(self, message):
+        """Можно вызывать из любого потока (синхронные views работают в пуле потоков)"""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # Event loop уже закрыт — подписчик больше не слушает
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _deliver(queue, message):
+        # Медленный клиент: выбрасываем самое старое сообщение, новое важнее
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                hub_class = getattr(settings, 'BOOKING_EVENTS_HUB', 'catalog.booking_events.InProcessHub')
+                _hub = import_string(hub_class)()
+    return _hub
+
+
+def notify_booking_change(action, bookings):
+    """Публикует изменение броней после успешного коммита
+
+    action: 'created', 'updated' или 'deleted'; bookings — брони (модели).
+    """
+    message = {
+        'action': action,
+        'ids': [booking.id for booking in bookings],
+        'product_ids': sorted({booking.product_id for booking in bookings}),
+    }
+    if message['ids']:
+        transaction.on_commit(lambda: _after_commit(message))
+
+
+def _after_commit(message):
+    # Фиды .ics перерисуются при следующем запросе
+    invalidate_feeds(message['product_ids'])
+    get_hub().publish(message)
+
+
+async def event_stream(queue):
+    """Генератор SSE: сообщения из очереди плюс пинги"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_MAX_AGE_SECONDS
+    try:
+        yield 'retry: 5000\n\n'
+        while loop.time() < deadline:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield f"event: booking\ndata: {json.dumps(message)}\n\n"
+    finally:
+        get_hub().unsubscribe(queue)
@@ -0,0 +1,68 @@
+"""Инкрементальная синхронизация календаря броней.
+
+Токен синхронизации — строка "<время в микросекундах>-<id последнего следа удаления>".
+Время — момент выдачи токена: всё, у чего updated_at позже, клиент ещё не видел.
+Клиент получает токен вместе с полной выборкой (заголовок X-Sync-Token) и дальше
+запрашивает только изменения после него.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Booking, DeletedBooking
+
+# Сколько хранятся следы удалений; более старый токен требует полной перезагрузки
+TOMBSTONE_RETENTION = timedelta(days=7)
+
+# Запас на транзакции, которые закоммитились позже своего updated_at:
+# такие брони придут повторно, но клиент просто перезапишет событие
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def current_sync_token():
+    """Токен на текущий момент; брать ДО выборки событий"""
+    last_deleted = DeletedBooking.objects.aggregate(value=Max('id'))['value'] or 0
+    micros = int(timezone.now().timestamp() * 1_000_000)
+    return f"{micros}-{last_deleted}"
+
+
+def parse_sync_token(token):
+    """(время выдачи, id следа удаления) или ValueError"""
+    micros, last_deleted = token.split('-', 1)
+    last_deleted = int(last_deleted)
+    if not 0 <= last_deleted < 2 ** 63:
+        raise ValueError(f"Invalid sync token: {token}")
+    try:
+        issued_at = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+    except (OverflowError, OSError) as e:
+        # Время за пределами datetime/платформы — такой токен мы не выдавали
+        raise ValueError(f"Invalid sync token: {token}") from e
+    return issued_at, last_deleted
+
+
+def is_token_expired(issued_at):
+    """Следы удалений старше токена уже могли быть удалены"""
+    return issued_at < timezone.now() - TOMBSTONE_RETENTION
+
+
+def record_deleted(bookings):
+    """Записывает следы удалённых броней и чистит устаревшие следы"""
+    DeletedBooking.objects.bulk_create([
+        DeletedBooking(booking_id=booking.id, product_id=booking.product_id)
+        for booking in bookings
+    ])
+    DeletedBooking.objects.filter(deleted_at__lt=timezone.now() - TOMBSTONE_RETENTION).delete()
+
+
+def changes_since(token, product_id=None):
+    """Изменённые брони (queryset) и id удалённых после токена"""
+    issued_at, last_deleted = parse_sync_token(token)
+
+    changed = Booking.objects.filter(updated_at__gt=issued_at - SYNC_OVERLAP)
+    deleted = DeletedBooking.objects.filter(id__gt=last_deleted)
+    if product_id is not None:
+        changed = changed.filter(product_id=product_id)
+        deleted = deleted.filter(product_id=product_id)
+
+    return changed, list(deleted.values_list('booking_id', flat=True))
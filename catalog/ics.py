@@ -0,0 +1,203 @@
+"""iCalendar-фиды броней (RFC 5545) для подписки из календарей телефонов.
+
+Фид рендерится один раз после изменения броней и лежит в кеше вместе с ETag,
+поэтому частые опросы календарных приложений не ходят в базу. Кеш сбрасывается
+из notify_booking_change; TTL страхует процессы с локальным (locmem) кешем,
+до которых сброс из другого процесса не доходит.
+"""
+import hashlib
+import secrets
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Booking, CalendarFeedToken, Product
+
+FEED_CACHE_TIMEOUT = 5 * 60
+# Прошедшие брони в фиде: достаточно для истории, не раздувает файл
+FEED_HISTORY_DAYS = 90
+
+ALL_BOOKINGS_KEY = 'catalog:ics:bookings'
+PRODUCT_KEY = 'catalog:ics:product:{}'
+# last_used_at обновляется не чаще: календари опрашивают фид каждые несколько минут
+TOKEN_USAGE_PRECISION = timedelta(hours=1)
+
+ICS_STATUS = {
+    'pending': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+    'cancelled': 'CANCELLED',
+    'completed': 'CONFIRMED',
+}
+
+
+def escape_text(value):
+    """Экранирование TEXT по RFC 5545"""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold_line(line):
+    """Перенос строк длиннее 75 октетов (продолжение начинается с пробела)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        chunk = encoded[:limit]
+        # Не режем многобайтовый символ UTF-8 пополам
+        while chunk and (encoded[len(chunk):len(chunk) + 1] or b'\x00')[0] & 0xC0 == 0x80:
+            chunk = chunk[:-1]
+        parts.append(chunk.decode('utf-8'))
+        encoded = encoded[len(chunk):]
+    return '\r\n '.join(parts)
+
+
+def render_calendar(name, events):
+    """events — список словарей с uid, start, end (включительно), summary, ..."""
+    now = datetime.now(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Play & Jump//Buchungen//DE',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+        'X-PUBLISHED-TTL:PT15M',
+    ]
+    for event in events:
+        lines += [
+            'BEGIN:VEVENT',
+            f"UID:{event['uid']}",
+            f"DTSTAMP:{event.get('stamp') or now}",
+            f"DTSTART;VALUE=DATE:{event['start'].strftime('%Y%m%d')}",
+            # DTEND для событий на весь день не включается в интервал
+            f"DTEND;VALUE=DATE:{(event['end'] + timedelta(days=1)).strftime('%Y%m%d')}",
+            f"SUMMARY:{escape_text(event['summary'])}",
+        ]
+        if event.get('description'):
+            lines.append(f"DESCRIPTION:{escape_text(event['description'])}")
+        if event.get('status'):
+            lines.append(f"STATUS:{event['status']}")
+        lines.append('TRANSP:OPAQUE')
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold_line(line) for line in lines) + '\r\n'
+
+
+def _stamp(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ') if value else None
+
+
+def _cached_feed(key, render):
+    """(etag, body) из кеша или свежий рендер; None, если render вернул None"""
+    entry = cache.get(key)
+    if entry is None:
+        body = render()
+        if body is None:
+            return None
+        entry = (f'"{hashlib.md5(body.encode("utf-8")).hexdigest()}"', body)
+        cache.set(key, entry, FEED_CACHE_TIMEOUT)
+    return entry
+
+
+def product_feed(slug):
+    """Фид занятости товара без персональных данных; None, если товара нет"""
+    def render():
+        product = Product.objects.filter(slug=slug, is_active=True).values('id', 'title').first()
+        if product is None:
+            return None
+        bookings = Booking.objects.filter(
+            product_id=product['id'],
+            end_date__gte=date.today() - timedelta(days=FEED_HISTORY_DAYS),
+            status__in=['confirmed', 'pending'],
+        ).order_by('start_date').values_list('id', 'start_date', 'end_date', 'status', 'updated_at')
+        return render_calendar(f"Play & Jump – {product['title']}", [
+            {
+                'uid': f'booking-{booking_id}@playandjump.de',
+                'stamp': _stamp(updated_at),
+                'start': start,
+                'end': end,
+                'summary': f"{product['title']} – belegt",
+                'status': ICS_STATUS[status],
+            }
+            for booking_id, start, end, status, updated_at in bookings
+        ])
+
+    return _cached_feed(PRODUCT_KEY.format(slug), render)
+
+
+def bookings_feed():
+    """Фид всех броней с деталями клиента (для сотрудников)"""
+    def render():
+        bookings = Booking.objects.filter(
+            end_date__gte=date.today() - timedelta(days=FEED_HISTORY_DAYS),
+        ).order_by('start_date').values_list(
+            'id', 'start_date', 'end_date', 'status', 'updated_at', 'customer_name',
+            'customer_email', 'customer_phone', 'notes', 'product__title',
+        )
+        return render_calendar('Play & Jump – Buchungen', [
+            {
+                'uid': f'booking-{booking_id}@playandjump.de',
+                'stamp': _stamp(updated_at),
+                'start': start,
+                'end': end,
+                'summary': f"{product_title} – {customer_name}",
+                'description': '\n'.join(filter(None, [
+                    f"Kunde: {customer_name}",
+                    f"E-Mail: {customer_email}",
+                    f"Telefon: {customer_phone}" if customer_phone else '',
+                    f"Notizen: {notes}" if notes else '',
+                ])),
+                'status': ICS_STATUS.get(status),
+            }
+            for (booking_id, start, end, status, updated_at, customer_name,
+                 customer_email, customer_phone, notes, product_title) in bookings
+        ])
+
+    return _cached_feed(ALL_BOOKINGS_KEY, render)
+
+
+def invalidate_feeds(product_ids):
+    """Сбрасывает кеш фидов после изменения броней указанных товаров"""
+    slugs = Product.objects.filter(id__in=product_ids).values_list('slug', flat=True)
+    cache.delete_many([ALL_BOOKINGS_KEY] + [PRODUCT_KEY.format(slug) for slug in slugs])
+
+
+def bookings_feed_token(user):
+    """Действующий токен сотрудника для подписки на фид всех броней; создаётся при первом обращении"""
+    feed_token = CalendarFeedToken.objects.filter(user=user, revoked_at__isnull=True).first()
+    if feed_token is None:
+        feed_token = CalendarFeedToken.objects.create(user=user, token=secrets.token_urlsafe(32))
+    return feed_token.token
+
+
+def rotate_bookings_feed_token(user):
+    """Отзывает токены сотрудника и выдаёт новый: старые ссылки на фид перестают работать"""
+    with transaction.atomic():
+        CalendarFeedToken.objects.filter(user=user, revoked_at__isnull=True).update(revoked_at=timezone.now())
+        return CalendarFeedToken.objects.create(user=user, token=secrets.token_urlsafe(32)).token
+
+
+def check_bookings_feed_token(token):
+    """Токен действует, пока не отозван и его владелец — активный сотрудник"""
+    if not token:
+        return False
+    feed_token = (
+        CalendarFeedToken.objects.select_related('user')
+        .filter(token=token, revoked_at__isnull=True).first()
+    )
+    if feed_token is None or not (feed_token.user.is_active and feed_token.user.is_staff):
+        return False
+    now = timezone.now()
+    if feed_token.last_used_at is None or now - feed_token.last_used_at > TOKEN_USAGE_PRECISION:
+        CalendarFeedToken.objects.filter(pk=feed_token.pk).update(last_used_at=now)
+    return True
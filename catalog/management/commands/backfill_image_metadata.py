@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.models import News, Product, ProductImage
+from catalog.renditions import image_metadata
+
+MODELS = (Product, ProductImage, News)
+FIELDS = ['image_width', 'image_height', 'image_placeholder']
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры и LQIP-заглушки для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересчитать и для записей, где размеры уже есть'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Процессов для чтения изображений (1 — без пула)'
+        )
+
+    def handle(self, *args, **options):
+        # Только id и имя файла — сами записи не нужны
+        rows = {}
+        for model in MODELS:
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['force']:
+                queryset = queryset.filter(image_width__isnull=True)
+            rows[model] = list(queryset.values_list('id', 'image'))
+
+        # Одинаковые файлы (общее хранилище img/) читаем один раз
+        paths = {}
+        for model, model_rows in rows.items():
+            storage = model._meta.get_field('image').storage
+            for _, name in model_rows:
+                paths.setdefault(storage.path(name), name)
+
+        metadata = {}
+        pool = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 1 and paths else None
+        run = pool.map if pool else map
+        try:
+            for item in run(image_metadata, list(paths)):
+                name = paths[item['path']]
+                if 'error' in item:
+                    self.stdout.write(self.style.WARNING(f"Не удалось прочитать {name}: {item['error']}"))
+                    continue
+                metadata[name] = item
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+        updated = 0
+        for model, model_rows in rows.items():
+            changed = [
+                model(
+                    id=pk,
+                    image_width=metadata[name]['width'],
+                    image_height=metadata[name]['height'],
+                    image_placeholder=metadata[name]['placeholder'],
+                )
+                for pk, name in model_rows if name in metadata
+            ]
+            with transaction.atomic():
+                model.objects.bulk_update(changed, FIELDS, batch_size=500)
+            updated += len(changed)
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {len(changed)} из {len(model_rows)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: файлов {len(metadata)} из {len(paths)}, обновлено записей {updated}"
+        ))
@@ -0,0 +1,144 @@
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from main.cart import get_items, save_items
+
+ENGINES = {
+    'file': 'django.contrib.sessions.backends.file',
+    'db': 'django.contrib.sessions.backends.db',
+    'sqlite': 'playandjump.sqlite_sessions',
+}
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает хранилища сессий при параллельных изменениях корзины'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engines',
+            default='file,db,sqlite',
+            help=f"Хранилища через запятую: {', '.join(ENGINES)}"
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Параллельных клиентов'
+        )
+        parser.add_argument(
+            '--updates',
+            type=int,
+            default=200,
+            help='Изменений корзины на клиента (каждое — чтение для бейджа плюс запись)'
+        )
+        parser.add_argument(
+            '--expired',
+            type=int,
+            default=0,
+            help='Дополнительно замерить удаление N просроченных сессий'
+        )
+
+    def client(self, engine, updates, latencies, errors, keys):
+        """Один посетитель: создаёт сессию и многократно меняет корзину"""
+        store_class = import_module(engine).SessionStore
+        try:
+            session = store_class()
+            save_items(session, [])
+            session.save()
+            keys.append(session.session_key)
+
+            first_day = date(2026, 6, 1).toordinal()
+            for i in range(updates):
+                # Страница с бейджем: только чтение
+                store_class(session.session_key).get('cart')
+
+                started = time.perf_counter()
+                try:
+                    session = store_class(session.session_key)
+                    items = get_items(session)
+                    day = first_day + i % 28
+                    items.append([i % 6 + 1, day, day + 2, 12000])
+                    save_items(session, items)
+                    session.save()
+                except Exception as e:
+                    errors.append(repr(e))
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def run_engine(self, name, options):
+        engine = ENGINES[name]
+        latencies, errors, keys = [], [], []
+        threads = [
+            threading.Thread(target=self.client, args=(engine, options['updates'], latencies, errors, keys))
+            for _ in range(options['threads'])
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        self.stdout.write(
+            f"{name:<8} {len(latencies) / elapsed:>9.0f} изм./с   "
+            f"p50 {statistics.median(latencies) * 1000:>7.2f} мс   "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:>7.2f} мс   "
+            f"max {latencies[-1] * 1000:>8.2f} мс   ошибок {len(errors)}"
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f"         первая ошибка: {errors[0]}"))
+
+        store_class = import_module(engine).SessionStore
+        for key in keys:
+            store_class().delete(key)
+
+    def sweep_engine(self, name, count):
+        """Время удаления просроченных сессий (clearsessions)"""
+        store_class = import_module(ENGINES[name]).SessionStore
+        for _ in range(count):
+            session = store_class()
+            save_items(session, [])
+            session.set_expiry(1)
+            session.save()
+        time.sleep(1.1)
+
+        started = time.perf_counter()
+        store_class.clear_expired()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{name:<8} очистка {count} просроченных: {elapsed * 1000:.0f} мс")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['engines'].split(',') if name.strip()]
+        unknown = set(names) - set(ENGINES)
+        if unknown:
+            self.stderr.write(f"Неизвестные хранилища: {', '.join(sorted(unknown))}")
+            return
+
+        # Файловое и SQLite-хранилище — во временной папке, чтобы не трогать живые сессии
+        workdir = tempfile.mkdtemp(prefix='bench_sessions_')
+        try:
+            with override_settings(SESSION_FILE_PATH=workdir, SESSION_SQLITE_PATH=f'{workdir}/sessions.sqlite3'):
+                self.stdout.write(
+                    f"{options['threads']} клиентов × {options['updates']} изменений, "
+                    f"база: {connection.vendor}"
+                )
+                for name in names:
+                    self.run_engine(name, options)
+
+                if options['expired']:
+                    for name in names:
+                        self.sweep_engine(name, options['expired'])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -1,11 +1,11 @@
 from django.core.management.base import BaseCommand, CommandError
-from django.core.files import File
-from django.core.files.uploadedfile import UploadedFile
+from django.core.files.base import ContentFile
 from catalog.models import Product, ProductImage
+from catalog.renditions import file_sha256, prepare_upload, save_renditions
+from concurrent.futures import ProcessPoolExecutor
 import os
 import glob
-from pathlib import Path
-from django.db import models
+from django.db import models, transaction
 
 
 class Command(BaseCommand):
@@ -34,6 +34,12 @@ class Command(BaseCommand):
             default='jpg,jpeg,png,gif,webp',
             help='Расширения файлов для загрузки (через запятую)'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Процессов для хеширования и уменьшения (1 — без пула)'
+        )
 
     def handle(self, *args, **options):
         product_id = options['product_id']
@@ -53,14 +59,14 @@ class Command(BaseCommand):
             raise CommandError(f'{folder_path} не является папкой')
 
         # Получаем список файлов с указанными расширениями
-        image_files = []
+        image_files = set()
         for ext in extensions:
             ext = ext.strip().lower()
             pattern = os.path.join(folder_path, f'*.{ext}')
-            image_files.extend(glob.glob(pattern))
+            image_files.update(glob.glob(pattern))
             # Также ищем файлы с заглавными расширениями
             pattern = os.path.join(folder_path, f'*.{ext.upper()}')
-            image_files.extend(glob.glob(pattern))
+            image_files.update(glob.glob(pattern))
 
         if not image_files:
             self.stdout.write(
@@ -71,56 +77,79 @@ class Command(BaseCommand):
             return
 
         # Сортируем файлы по имени
-        image_files.sort()
+        image_files = sorted(image_files)
 
         # Получаем текущий максимальный порядок
         current_max_order = ProductImage.objects.filter(product=product).aggregate(
             max_order=models.Max('order')
         )['max_order'] or 0
+        field = ProductImage._meta.get_field('image')
+        storage = field.storage
+        existing_paths = [
+            storage.path(name)
+            for name in ProductImage.objects.filter(product=product).values_list('image', flat=True)
+        ]
+
+        # Хеши, типы и копии считаются в пуле процессов; в БД и хранилище пишет
+        # только этот процесс, по мере готовности результатов
+        pool = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 1 else None
+        run = pool.map if pool else map
+        new_images = []
+        saved_names = []
+        try:
+            known_hashes = {h for h in run(file_sha256, existing_paths) if h}
+            for item in run(prepare_upload, image_files):
+                filename = os.path.basename(item['path'])
+                if 'error' in item:
+                    self.stdout.write(self.style.ERROR(f'Ошибка при загрузке {item["path"]}: {item["error"]}'))
+                    continue
 
-        uploaded_count = 0
-        for i, image_path in enumerate(image_files):
-            try:
-                # Создаем имя файла
-                filename = os.path.basename(image_path)
-                
-                # Проверяем, не существует ли уже изображение с таким именем
-                if ProductImage.objects.filter(product=product, image__endswith=filename).exists():
+                # Одинаковое содержимое — тот же файл, даже под другим именем
+                if item['sha256'] in known_hashes:
                     self.stdout.write(
                         self.style.WARNING(f'Изображение {filename} уже существует, пропускаем')
                     )
                     continue
-
-                # Открываем файл
-                with open(image_path, 'rb') as f:
-                    # Создаем UploadedFile
-                    uploaded_file = UploadedFile(
-                        file=File(f),
-                        name=filename,
-                        content_type='image/jpeg'  # Можно улучшить определение типа
-                    )
-
-                    # Создаем ProductImage
-                    product_image = ProductImage(
-                        product=product,
-                        image=uploaded_file,
-                        alt_text=f'{product.title} - {filename}',
-                        order=current_max_order + start_order + i
-                    )
-                    product_image.save()
-                    
-                    uploaded_count += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(f'Загружено: {filename}')
-                    )
-
-            except Exception as e:
+                known_hashes.add(item['sha256'])
+
+                # Расширение по настоящему формату (PNG с именем .jpg станет .png)
+                stem = os.path.splitext(filename)[0]
+                product_image = ProductImage(
+                    product=product,
+                    alt_text=f'{product.title} - {filename}',
+                    order=current_max_order + start_order + len(new_images),
+                    image_width=item['width'],
+                    image_height=item['height'],
+                    image_placeholder=item['placeholder'],
+                )
+                name = storage.save(
+                    field.generate_filename(product_image, f"{stem}.{item['extension']}"),
+                    ContentFile(item['data'])
+                )
+                if not getattr(storage, 'content_addressed', False):
+                    # Файл по содержимому может принадлежать другим записям — его не удаляем
+                    saved_names.append(name)
+                save_renditions(storage, name, item['renditions'])
+                product_image.image.name = name
+                new_images.append(product_image)
                 self.stdout.write(
-                    self.style.ERROR(f'Ошибка при загрузке {image_path}: {e}')
+                    self.style.SUCCESS(f'Загружено: {filename} ({item["mime"]})')
                 )
 
+            # Все записи — одним запросом в одной транзакции
+            with transaction.atomic():
+                ProductImage.objects.bulk_create(new_images)
+        except BaseException:
+            # Без записей в БД файлы никому не нужны
+            for name in saved_names:
+                storage.delete(name)
+            raise
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Готово! Загружено {uploaded_count} изображений в продукт "{product.title}"'
+                f'Готово! Загружено {len(new_images)} изображений в продукт "{product.title}"'
             )
         )
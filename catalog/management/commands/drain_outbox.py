@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.outbox import close_pooled_connection, drain
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди (OutboxEmail) с повторами и экспоненциальной задержкой'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь один раз и выйти (для периодической задачи)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, когда очередь пуста (постоянная задача)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Писем за один проход'
+        )
+
+    def report(self, result):
+        line = f"Отправлено: {result.sent}, отложено: {result.retried}"
+        if result.connect_ms:
+            line += f", соединение: {result.connect_ms} мс"
+        if result.send_ms:
+            line += (
+                f", отправка: в среднем {sum(result.send_ms) // len(result.send_ms)} мс,"
+                f" макс. {max(result.send_ms)} мс"
+            )
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                # Постоянный обработчик держит SMTP-соединение между проходами
+                result = drain(options['limit'], keep_open=not options['once'])
+                if result.sent or result.retried:
+                    self.report(result)
+
+                if options['once']:
+                    # В режиме --once дочищаем очередь, пока есть что отправлять
+                    if result.sent == options['limit']:
+                        continue
+                    return
+                if not result.sent and not result.retried:
+                    time.sleep(options['interval'])
+        finally:
+            close_pooled_connection()
@@ -0,0 +1,103 @@
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from catalog.availability import conflicts_queryset, matrix_bookings, occupied_querysets, range_conflicts_queryset
+from catalog.models import Availability, Booking, Product
+from catalog.views import calendar_bookings, calendar_event_rows, upcoming_bookings_queryset
+
+
+class Command(BaseCommand):
+    help = 'Выполняет EXPLAIN для горячих запросов по броням и показывает, используются ли индексы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=int,
+            help='ID товара для запросов по одному товару (по умолчанию первый активный)'
+        )
+        parser.add_argument(
+            '--plan',
+            action='store_true',
+            help='Печатать полный план каждого запроса'
+        )
+
+    def hot_queries(self, product_id):
+        """Запросы строятся теми же функциями, что вызывают views/availability"""
+        today = date.today()
+        year_end = today + timedelta(days=365)
+        month_end = today + timedelta(days=62)
+        bookings, blocks = occupied_querysets(product_id, today, month_end)
+
+        return [
+            ('product_detail / product_availability: брони товара', bookings),
+            ('product_detail / product_availability: блокировки товара', blocks),
+            ('get_bookings_data: все товары', calendar_event_rows(calendar_bookings(None, today, month_end))),
+            ('get_bookings_data: один товар', calendar_event_rows(calendar_bookings(product_id, today, month_end))),
+            ('booking_management: ближайшие брони', upcoming_bookings_queryset(today)),
+            ('create_booking / update_booking: пересечения', conflicts_queryset(product_id, today, month_end)),
+            ('send_inquiry: пересечения позиций корзины',
+             range_conflicts_queryset([(product_id, today, month_end)])),
+            ('get_occupancy_matrix: брони всех товаров', matrix_bookings(today, year_end)),
+        ]
+
+    def booking_tables(self):
+        return {Booking._meta.db_table, Availability._meta.db_table}
+
+    def analyse(self, plan):
+        """Возвращает (использованные индексы, таблицы с полным сканированием)"""
+        indexes = set()
+        full_scans = set()
+        for table in self.booking_tables():
+            if connection.vendor == 'sqlite':
+                # SQLite: "SEARCH catalog_booking USING INDEX name (...)" или "SCAN catalog_booking"
+                for line in plan.splitlines():
+                    if re.search(rf'\b(SCAN|SEARCH) {table}\b', line):
+                        match = re.search(r'USING (?:COVERING )?INDEX (\w+)', line)
+                        if match:
+                            indexes.add(match.group(1))
+                        elif 'USING INTEGER PRIMARY KEY' not in line:
+                            full_scans.add(table)
+            else:
+                # PostgreSQL: "Index Scan using name on catalog_booking" / "Seq Scan on catalog_booking"
+                indexes.update(re.findall(rf'Index (?:Only )?Scan using (\w+) on {table}\b', plan))
+                indexes.update(re.findall(r'Bitmap Index Scan on (\w+)', plan))
+                if re.search(rf'Seq Scan on {table}\b', plan):
+                    full_scans.add(table)
+        return indexes, full_scans
+
+    def handle(self, *args, **options):
+        product_id = options['product']
+        if product_id is None:
+            product_id = Product.objects.filter(is_active=True).values_list('id', flat=True).first() or 0
+
+        self.stdout.write(f"База: {connection.vendor}, товар: {product_id}")
+
+        problems = 0
+        for name, queryset in self.hot_queries(product_id):
+            plan = queryset.explain()
+            indexes, full_scans = self.analyse(plan)
+
+            if full_scans:
+                problems += 1
+                self.stdout.write(self.style.WARNING(
+                    f"[SCAN]  {name}: полное сканирование {', '.join(sorted(full_scans))}"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"[INDEX] {name}: {', '.join(sorted(indexes)) or 'индекс не указан в плане'}"
+                ))
+
+            if options['plan']:
+                self.stdout.write(plan)
+                self.stdout.write('')
+
+        if problems:
+            self.stdout.write(self.style.WARNING(
+                f'{problems} запрос(ов) без индекса. На маленьких таблицах PostgreSQL может '
+                f'выбирать Seq Scan сам — выполните ANALYZE и повторите на реальных данных.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Все горячие запросы используют индексы'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Category, MissingProduct, News, Product, ProductImage
+from catalog.renditions import generate_renditions
+
+MODELS = (Product, ProductImage, Category, News, MissingProduct)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии (WebP/JPEG) для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть'
+        )
+
+    def handle(self, *args, **options):
+        created = skipped = 0
+        for model in MODELS:
+            names = model.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True)
+            field = model._meta.get_field('image')
+            for name in names.distinct():
+                # Модель не загружаем: нужен только файл поля
+                field_file = field.attr_class(None, field, name)
+                if generate_renditions(field_file, force=options['force']):
+                    created += 1
+                    self.stdout.write(f"Создано: {name}")
+                else:
+                    skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Готово: создано {created}, пропущено {skipped}"))
@@ -0,0 +1,100 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.models import Category, MissingProduct, News, Product, ProductImage
+from catalog.renditions import delete_renditions, file_sha256, generate_renditions
+from catalog.storage import CAS_DIR, content_name, image_storage
+
+MODELS = (Product, ProductImage, Category, News, MissingProduct)
+
+
+class Command(BaseCommand):
+    help = 'Переносит изображения в хранилище по SHA-256 (img/) и удаляет дубликаты'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать дубликаты и экономию, ничего не менять'
+        )
+
+    def referenced_names(self):
+        names = set()
+        for model in MODELS:
+            names.update(model.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True))
+        return names
+
+    def handle(self, *args, **options):
+        storage = image_storage
+        dry_run = options['dry_run']
+        # старое имя -> новое имя (одинаковые файлы получают одно имя)
+        moved = {}
+        missing = set()
+        updated = 0
+
+        for model in MODELS:
+            # Только имена: одно UPDATE на файл, записи не загружаются
+            names = (
+                model.objects.exclude(image='').exclude(image__isnull=True)
+                .exclude(image__startswith=f"{CAS_DIR}/").values_list('image', flat=True).distinct()
+            )
+            changed = []
+            for old in names:
+                if old not in moved and old not in missing:
+                    if dry_run:
+                        digest = file_sha256(storage.path(old))
+                        new = content_name(digest, old) if digest else None
+                    else:
+                        try:
+                            with storage.open(old, 'rb') as f:
+                                new = storage.save(old, f)
+                        except FileNotFoundError:
+                            new = None
+                    if new is None:
+                        missing.add(old)
+                        self.stdout.write(self.style.WARNING(f"Файл не найден: {old}"))
+                        continue
+                    moved[old] = new
+                if old in missing:
+                    continue
+                changed.append(old)
+
+            count = model.objects.filter(image__in=changed).count()
+            if changed and not dry_run:
+                with transaction.atomic():
+                    for old in changed:
+                        model.objects.filter(image=old).update(image=moved[old])
+            updated += count
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {count} записей")
+
+        unique = set(moved.values())
+        sizes = {old: os.path.getsize(storage.path(old)) for old in moved}
+        kept = {new: sizes[old] for old, new in moved.items()}
+        duplicate_bytes = sum(sizes.values()) - sum(kept.values())
+        self.stdout.write(
+            f"Файлов: {len(moved)}, уникальных: {len(unique)}, "
+            f"дубликаты занимали {duplicate_bytes / 1024 / 1024:.1f} МБ"
+        )
+        if dry_run:
+            return
+
+        # Копии для новых имён, затем удаляем старые файлы, на которые никто не ссылается
+        field = Product._meta.get_field('image')
+        for new in unique:
+            generate_renditions(field.attr_class(None, field, new))
+
+        referenced = self.referenced_names()
+        removed = 0
+        for old in moved:
+            if old in referenced or not storage.exists(old):
+                continue
+            storage.delete(old)
+            delete_renditions(storage, old)
+            removed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: обновлено записей {updated}, удалено старых файлов {removed}, "
+            f"без дубликатов освободилось {duplicate_bytes / 1024 / 1024:.1f} МБ"
+        ))
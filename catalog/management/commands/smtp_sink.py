@@ -0,0 +1,116 @@
+import os
+import random
+import socketserver
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP: принимает любые письма (и любой логин) и сохраняет их в .eml"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        self.reply('220 localhost smtp-sink')
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                if verb == 'EHLO':
+                    self.reply('250-localhost')
+                    self.reply('250-8BITMIME')
+                    self.reply('250 AUTH PLAIN LOGIN')
+                else:
+                    self.reply('250 localhost')
+            elif verb == 'AUTH':
+                if command.upper().startswith('AUTH LOGIN'):
+                    # Имя пользователя и пароль приходят отдельными строками
+                    self.reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self.reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                mail_from, recipients = command[10:].strip(' <>'), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    # Снимаем dot-stuffing
+                    data.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                if random.random() < self.server.fail_rate:
+                    self.reply('451 Temporary failure (simulated)')
+                else:
+                    self.server.store(mail_from, recipients, b''.join(data))
+                    self.reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, outdir, fail_rate, stdout):
+        super().__init__(address, SMTPSinkHandler)
+        self.outdir = outdir
+        self.fail_rate = fail_rate
+        self.stdout = stdout
+        self.received = 0
+
+    def store(self, mail_from, recipients, data):
+        self.received += 1
+        if self.outdir:
+            name = f"{datetime.now():%Y%m%d-%H%M%S}-{self.received:05d}.eml"
+            with open(os.path.join(self.outdir, name), 'wb') as f:
+                f.write(data)
+        self.stdout.write(f"#{self.received} {mail_from} -> {', '.join(recipients)} ({len(data)} байт)")
+
+
+class Command(BaseCommand):
+    help = (
+        'Локальный SMTP-сервер для проверки отправки писем без Gmail. '
+        "В settings: EMAIL_HOST = 'localhost', EMAIL_PORT = 1025, EMAIL_USE_TLS = False"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=1025, help='Порт (по умолчанию 1025)')
+        parser.add_argument('--outdir', help='Папка для сохранения писем в формате .eml')
+        parser.add_argument(
+            '--fail-rate',
+            type=float,
+            default=0.0,
+            help='Доля писем, на которые отвечать временной ошибкой 451 (проверка повторов)'
+        )
+
+    def handle(self, *args, **options):
+        if options['outdir']:
+            os.makedirs(options['outdir'], exist_ok=True)
+        server = SMTPSink(('127.0.0.1', options['port']), options['outdir'], options['fail_rate'], self.stdout)
+        self.stdout.write(f"SMTP-заглушка слушает 127.0.0.1:{options['port']} (Ctrl+C — выход)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
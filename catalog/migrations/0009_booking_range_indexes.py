@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_missingproduct_delete_service"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="availability",
+            index=models.Index(
+                fields=["product", "end_date", "start_date"],
+                name="avail_product_range_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["product", "end_date", "start_date", "status"],
+                name="booking_product_range_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["end_date", "start_date"], name="booking_range_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["start_date"], name="booking_start_idx"),
+        ),
+    ]
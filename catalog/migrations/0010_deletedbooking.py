@@ -0,0 +1,39 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_booking_range_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletedBooking",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("booking_id", models.BigIntegerField()),
+                ("product_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "verbose_name": "Gelöschte Buchung",
+                "verbose_name_plural": "Gelöschte Buchungen",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["updated_at"], name="booking_updated_idx"),
+        ),
+    ]
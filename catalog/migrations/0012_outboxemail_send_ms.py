@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxemail",
+            name="send_ms",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Sendedauer (ms)"
+            ),
+        ),
+    ]
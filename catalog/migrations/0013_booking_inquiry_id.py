@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_outboxemail_send_ms"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="inquiry_id",
+            field=models.UUIDField(
+                blank=True, db_index=True, null=True, verbose_name="Anfrage-Nr."
+            ),
+        ),
+    ]
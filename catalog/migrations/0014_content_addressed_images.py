@@ -0,0 +1,59 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:30
+
+import catalog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0013_booking_inquiry_id"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=catalog.storage.get_image_storage,
+                upload_to="categories/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="missingproduct",
+            name="image",
+            field=models.ImageField(
+                storage=catalog.storage.get_image_storage,
+                upload_to="missing_products/",
+                verbose_name="Bild",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="news",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=catalog.storage.get_image_storage,
+                upload_to="news/",
+                verbose_name="Hauptbild",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="image",
+            field=models.ImageField(
+                storage=catalog.storage.get_image_storage, upload_to="products/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=models.ImageField(
+                storage=catalog.storage.get_image_storage,
+                upload_to="products/additional/",
+            ),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.23 on 2026-10-18 23:40
+
+import catalog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_content_addressed_images"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="news",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Bildhöhe"
+            ),
+        ),
+        migrations.AddField(
+            model_name="news",
+            name="image_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="Bildplatzhalter"
+            ),
+        ),
+        migrations.AddField(
+            model_name="news",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Bildbreite"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="image_height",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="image_placeholder",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="image_width",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="image_height",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="image_placeholder",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="image_width",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="news",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                height_field="image_height",
+                null=True,
+                storage=catalog.storage.get_image_storage,
+                upload_to="news/",
+                verbose_name="Hauptbild",
+                width_field="image_width",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="image",
+            field=models.ImageField(
+                height_field="image_height",
+                storage=catalog.storage.get_image_storage,
+                upload_to="products/",
+                width_field="image_width",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=models.ImageField(
+                height_field="image_height",
+                storage=catalog.storage.get_image_storage,
+                upload_to="products/additional/",
+                width_field="image_width",
+            ),
+        ),
+    ]
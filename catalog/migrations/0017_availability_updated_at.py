@@ -0,0 +1,22 @@
+# Generated by Django 4.2.23 on 2026-10-19 10:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0016_image_dimensions_plain_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="availability",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
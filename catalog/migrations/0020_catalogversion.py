@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0019_calendarfeedtoken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogVersion",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("changed_at", models.FloatField(default=0)),
+            ],
+            options={
+                "verbose_name": "Katalogversion",
+                "verbose_name_plural": "Katalogversionen",
+            },
+        ),
+    ]
@@ -1,15 +1,23 @@
+import time
+
 from django.db import models
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from ckeditor.fields import RichTextField
 
+from .renditions import field_file_metadata, generate_renditions
+from .storage import get_image_storage
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
-    image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    image = models.ImageField(upload_to='categories/', storage=get_image_storage, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -25,15 +33,31 @@ class Category(models.Model):
         super().save(*args, **kwargs)
 
 
+class ProductQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Массовые изменения (действия админки) тоже сбрасывают проверенные счётчики корзин"""
+        rows = super().update(**kwargs)
+        if rows:
+            touch_products_version()
+        return rows
+
+
 class Product(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = RichTextField(blank=True, config_name='product_description')
-    image = models.ImageField(upload_to="products/")
+    image = models.ImageField(upload_to="products/", storage=get_image_storage)
+    # Размеры и LQIP-заглушка (крошечная копия в data:-URI) заполняются при
+    # сохранении, см. set_image_metadata; шаблоны берут их без чтения файла
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
     price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     is_active = models.BooleanField(default=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products', null=True, blank=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Produkt"
         verbose_name_plural = "Produkte"
@@ -50,9 +74,59 @@ class Product(models.Model):
         super().save(*args, **kwargs)
 
 
+class CatalogVersion(models.Model):
+    """Время последнего изменения данных каталога — в базе, одно на все процессы"""
+    name = models.CharField(max_length=50, primary_key=True)
+    changed_at = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = "Katalogversion"
+        verbose_name_plural = "Katalogversionen"
+
+    def __str__(self):
+        return self.name
+
+
+# Время последнего изменения товаров: сохранённые в сессиях счётчики корзины
+# старше этой отметки перепроверяются по базе
+PRODUCTS_VERSION = 'products'
+# Отметка читается из базы не чаще раза в PRODUCTS_VERSION_TTL секунд на процесс,
+# чтобы бейдж корзины не стоил запроса на каждой странице. Изменение в другом
+# процессе становится видно с такой задержкой — для бейджа это допустимо,
+# заявка всё равно перепроверяет корзину по базе.
+PRODUCTS_VERSION_TTL = 30
+_products_version = {'value': 0, 'checked_at': None}
+
+
+def products_version():
+    now = time.monotonic()
+    checked_at = _products_version['checked_at']
+    if checked_at is None or now - checked_at >= PRODUCTS_VERSION_TTL:
+        _products_version['value'] = CatalogVersion.objects.filter(
+            name=PRODUCTS_VERSION
+        ).values_list('changed_at', flat=True).first() or 0
+        _products_version['checked_at'] = now
+    return _products_version['value']
+
+
+def touch_products_version():
+    changed_at = time.time()
+    CatalogVersion.objects.update_or_create(name=PRODUCTS_VERSION, defaults={'changed_at': changed_at})
+    # Свой процесс видит изменение сразу
+    _products_version.update(value=changed_at, checked_at=time.monotonic())
+
+
+@receiver([post_save, post_delete], sender=Product)
+def bump_products_version(sender, **kwargs):
+    touch_products_version()
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='additional_images')
-    image = models.ImageField(upload_to='products/additional/')
+    image = models.ImageField(upload_to='products/additional/', storage=get_image_storage)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
     alt_text = models.CharField(max_length=200, blank=True)
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -72,7 +146,10 @@ class News(models.Model):
     slug = models.SlugField(unique=True, verbose_name="URL")
     content = models.TextField(verbose_name="Inhalt")
     excerpt = models.TextField(max_length=500, blank=True, verbose_name="Kurzbeschreibung")
-    image = models.ImageField(upload_to='news/', blank=True, null=True, verbose_name="Hauptbild")
+    image = models.ImageField(upload_to='news/', storage=get_image_storage, blank=True, null=True, verbose_name="Hauptbild")
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Bildbreite")
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Bildhöhe")
+    image_placeholder = models.TextField(blank=True, editable=False, verbose_name="Bildplatzhalter")
     video_url = models.URLField(blank=True, null=True, verbose_name="Video-URL (YouTube/Vimeo)")
     is_published = models.BooleanField(default=True, verbose_name="Veröffentlicht")
     published_at = models.DateTimeField(auto_now_add=True, verbose_name="Veröffentlichungsdatum")
@@ -102,11 +179,17 @@ class Availability(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     is_available = models.BooleanField(default=False)
+    # Для ETag занятости: правка дат или статуса блокировки меняет версию
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['start_date']
         verbose_name = "Verfügbarkeit"
         verbose_name_plural = "Verfügbarkeiten"
+        indexes = [
+            # Блокировки товара, пересекающие окно дат
+            models.Index(fields=['product', 'end_date', 'start_date'], name='avail_product_range_idx'),
+        ]
 
     def __str__(self):
         status = "verfügbar" if self.is_available else "nicht verfügbar"
@@ -121,6 +204,15 @@ class Booking(models.Model):
         ('completed', 'Abgeschlossen'),
     ]
     
+    # Цвета статусов в календарях администратора
+    STATUS_COLORS = {
+        'pending': '#ffc107',      # Желтый
+        'confirmed': '#28a745',    # Зеленый
+        'cancelled': '#dc3545',    # Красный
+        'completed': '#6c757d',    # Серый
+    }
+    DEFAULT_COLOR = '#007bff'
+    
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='bookings')
     customer_name = models.CharField(max_length=200)
     customer_email = models.EmailField()
@@ -132,11 +224,24 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True)
+    # Брони из одной заявки с сайта (корзины) связаны общим номером
+    inquiry_id = models.UUIDField(null=True, blank=True, db_index=True, verbose_name="Anfrage-Nr.")
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Buchung"
         verbose_name_plural = "Buchungen"
+        indexes = [
+            # Брони товара в окне дат: product = X AND end_date >= ... AND start_date <= ...;
+            # end_date первым после товара отсекает историю прошлых сезонов, status — покрывающее поле
+            models.Index(fields=['product', 'end_date', 'start_date', 'status'], name='booking_product_range_idx'),
+            # Календарь по всем товарам (get_bookings_data без фильтра, матрица занятости)
+            models.Index(fields=['end_date', 'start_date'], name='booking_range_idx'),
+            # Ближайшие брони в booking_management
+            models.Index(fields=['start_date'], name='booking_start_idx'),
+            # Инкрементальная синхронизация календаря (updated_at > токен)
+            models.Index(fields=['updated_at'], name='booking_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.customer_name} - {self.product.title} ({self.start_date} bis {self.end_date})"
@@ -147,16 +252,123 @@ class Booking(models.Model):
             return (self.end_date - self.start_date).days + 1
         return 0
 
+    @staticmethod
+    def calculate_total_price(price_per_day, start_date, end_date):
+        """Цена за день × число дней (включительно); без цены товара — 0"""
+        if not price_per_day:
+            return 0
+        return price_per_day * ((end_date - start_date).days + 1)
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
 
 
+class DeletedBooking(models.Model):
+    """Следы удалённых броней для инкрементальной синхронизации календаря"""
+    booking_id = models.BigIntegerField()
+    # Простое число, а не FK: след должен пережить удаление товара
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Gelöschte Buchung"
+        verbose_name_plural = "Gelöschte Buchungen"
+
+    def __str__(self):
+        return f"Buchung #{self.booking_id} gelöscht am {self.deleted_at}"
+
+
+class OutboxEmail(models.Model):
+    """Исходящее письмо: сохраняется в транзакции запроса, отправляет команда drain_outbox"""
+    KIND_CHOICES = [
+        ('inquiry', 'Anfrage'),
+        ('confirmation', 'Bestätigung an Kunden'),
+        ('contact', 'Kontaktformular'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Wartend'),
+        ('sent', 'Gesendet'),
+        ('failed', 'Fehlgeschlagen'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    send_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name="Sendedauer (ms)")
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = "E-Mail in Warteschlange"
+        verbose_name_plural = "E-Mail-Warteschlange"
+        indexes = [
+            # Выборка писем, срок отправки которых наступил
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.subject} ({self.get_status_display()})"
+
+
+class CalendarFeedToken(models.Model):
+    """Личный токен сотрудника для подписки на iCalendar-фид всех броней
+
+    В фиде персональные данные клиентов, поэтому у каждого сотрудника свой
+    случайный токен: его можно отозвать или заменить, не трогая остальных.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_feed_tokens', verbose_name="Mitarbeiter")
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Erstellt")
+    last_used_at = models.DateTimeField(null=True, blank=True, verbose_name="Zuletzt verwendet")
+    revoked_at = models.DateTimeField(null=True, blank=True, verbose_name="Widerrufen")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Kalender-Token"
+        verbose_name_plural = "Kalender-Tokens"
+
+    def __str__(self):
+        return f"{self.user} ({self.token[:6]}…)"
+
+
+class IdempotencyKey(models.Model):
+    """Idempotency-Key отправки формы (main.idempotency): один на сессию и токен
+
+    Строка без response — запрос ещё выполняется. Ответ записывается в той же
+    транзакции, что и заявка, поэтому повтор после сбоя не создаст её второй раз.
+    """
+    scope = models.CharField(max_length=20)
+    # SHA-256 от ключа сессии и токена клиента
+    key = models.CharField(max_length=64)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Idempotency-Key"
+        verbose_name_plural = "Idempotency-Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}: {self.key[:12]}"
+
+
 class MissingProduct(models.Model):
     """Модель для управления дополнительными товарами в разделе Zusätzliche Produkte"""
     title = models.CharField(max_length=200, verbose_name="Titel")
     slug = models.SlugField(unique=True, verbose_name="URL")
     description = models.TextField(blank=True, verbose_name="Beschreibung")
-    image = models.ImageField(upload_to="missing_products/", verbose_name="Bild")
+    image = models.ImageField(upload_to="missing_products/", storage=get_image_storage, verbose_name="Bild")
     price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, verbose_name="Preis")
     is_active = models.BooleanField(default=True, verbose_name="Aktiv")
     order = models.PositiveIntegerField(default=0, verbose_name="Anzeigereihenfolge")
@@ -179,4 +391,49 @@ class MissingProduct(models.Model):
     @classmethod
     def get_active_missing_products(cls, limit=2):
         """Возвращает активные дополнительные товары (максимум 2)"""
-        return cls.objects.filter(is_active=True).order_by('order', 'created_at')[:limit] 
\ No newline at end of file
+        return cls.objects.filter(is_active=True).order_by('order', 'created_at')[:limit] 
+
+
+@receiver([post_init, post_save], sender=Product)
+@receiver([post_init, post_save], sender=ProductImage)
+@receiver([post_init, post_save], sender=News)
+def remember_image_name(sender, instance, **kwargs):
+    """Имя файла в базе — чтобы при сохранении понять, сменилось ли изображение"""
+    # Через __dict__: поле может быть отложено (only/defer), читать его нельзя
+    value = instance.__dict__.get('image')
+    instance._saved_image_name = getattr(value, 'name', value)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=News)
+def set_image_metadata(sender, instance, **kwargs):
+    """Размеры и заглушка считаются один раз — когда у записи сменился файл
+
+    Отсутствующий или битый файл сохранение не ломает: поля остаются пустыми.
+    """
+    if 'image' not in instance.__dict__:
+        return
+    image = instance.image
+    if not image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+        return
+    if (image._committed and image.name == instance._saved_image_name
+            and instance.image_width is not None):
+        return
+    metadata = field_file_metadata(image) or {'width': None, 'height': None, 'placeholder': ''}
+    instance.image_width = metadata['width']
+    instance.image_height = metadata['height']
+    instance.image_placeholder = metadata['placeholder']
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=News)
+@receiver(post_save, sender=MissingProduct)
+def create_image_renditions(sender, instance, **kwargs):
+    """Уменьшенные копии для карточек и srcset сразу после загрузки изображения"""
+    if instance.image:
+        generate_renditions(instance.image)
@@ -0,0 +1,214 @@
+"""Очередь исходящих писем (outbox).
+
+Views только сохраняют письмо в таблицу OutboxEmail в своей транзакции и сразу
+отвечают клиенту; медленный или недоступный SMTP больше не держит рабочий процесс.
+Отправляет команда `manage.py drain_outbox` (постоянная или периодическая задача):
+неудачные попытки повторяются с экспоненциальной задержкой, после MAX_ATTEMPTS
+письмо помечается как failed и видно в админке.
+
+Обработчик держит одно SMTP-соединение на весь процесс (TLS-рукопожатие
+и вход в Gmail — самая дорогая часть отправки) и переоткрывает его только
+после простоя или разрыва. Время соединения и каждой отправки записывается:
+send_ms у письма, сводка — в DrainResult.
+"""
+import logging
+import smtplib
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# 1, 2, 4, ... минут, но не больше 6 часов: 20 попыток — около трёх суток,
+# чтобы долгий сбой SMTP (пароль приложения, блокировка) не терял заявки
+MAX_ATTEMPTS = 20
+BASE_BACKOFF = timedelta(minutes=1)
+MAX_BACKOFF = timedelta(hours=6)
+# Пока письмо отправляется, другие обработчики его не берут
+LEASE = timedelta(minutes=10)
+# SMTP-серверы закрывают простаивающие соединения; Gmail — через несколько минут
+POOL_IDLE_SECONDS = 60
+# Соединение, простоявшее дольше, перед отправкой проверяется командой NOOP
+NOOP_AFTER_SECONDS = 5
+# Писем на один вызов send_messages и одно сохранение статусов
+BATCH_SIZE = 10
+
+DrainResult = namedtuple('DrainResult', ['sent', 'retried', 'connect_ms', 'send_ms'])
+
+# Соединение обработчика: drain_outbox работает в одном потоке
+_pool = {'connection': None, 'used_at': 0.0}
+
+
+def queue_email(kind, subject, body, to, html_body='', from_email=None):
+    """Ставит письмо в очередь; вызывать внутри транзакции запроса"""
+    return OutboxEmail.objects.create(
+        kind=kind,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def backoff(attempts):
+    return min(BASE_BACKOFF * 2 ** max(attempts - 1, 0), MAX_BACKOFF)
+
+
+def build_message(email, connection=None):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    message.encoding = 'utf-8'
+    return message
+
+
+def claim_due(limit):
+    """Письма, срок которых наступил; каждое забирается условным UPDATE,
+    поэтому два параллельных обработчика не отправят одно письмо дважды"""
+    now = timezone.now()
+    due = OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')[:limit]
+    claimed = []
+    for email in due:
+        taken = OutboxEmail.objects.filter(
+            id=email.id, status='pending', next_attempt_at=email.next_attempt_at,
+        ).update(next_attempt_at=now + LEASE)
+        if taken:
+            claimed.append(email)
+    return claimed
+
+
+def _mark_failed_attempt(email, error):
+    email.attempts += 1
+    email.last_error = error[:2000]
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'failed'
+        logger.error(f"Outbox email {email.id} failed permanently: {error}")
+    else:
+        email.next_attempt_at = timezone.now() + backoff(email.attempts)
+        logger.warning(f"Outbox email {email.id} attempt {email.attempts} failed: {error}")
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _elapsed_ms(started):
+    return int((time.perf_counter() - started) * 1000)
+
+
+def close_pooled_connection():
+    connection = _pool['connection']
+    _pool['connection'] = None
+    if connection is not None:
+        try:
+            connection.close()
+        except (smtplib.SMTPException, OSError):
+            # Соединение уже разорвано — закрывать нечего
+            pass
+
+
+def _is_alive(connection):
+    """NOOP по открытому SMTP-соединению; другие бэкенды (console, locmem) считаются живыми"""
+    if not hasattr(connection, 'connection'):
+        return True
+    if connection.connection is None:
+        return False
+    try:
+        return connection.connection.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def pooled_connection():
+    """Открытое соединение обработчика и время его открытия в мс (0 — уже было открыто)"""
+    if _pool['connection'] is not None:
+        idle = time.monotonic() - _pool['used_at']
+        if idle > POOL_IDLE_SECONDS or (idle > NOOP_AFTER_SECONDS and not _is_alive(_pool['connection'])):
+            close_pooled_connection()
+
+    connect_ms = 0
+    if _pool['connection'] is None:
+        connection = get_connection(fail_silently=False)
+        started = time.perf_counter()
+        connection.open()
+        connect_ms = _elapsed_ms(started)
+        _pool['connection'] = connection
+    _pool['used_at'] = time.monotonic()
+    return _pool['connection'], connect_ms
+
+
+def _send(email):
+    """Отправляет одно письмо через общее соединение; возвращает время в мс
+
+    Закрытое сервером соединение обнаруживается до отправки (NOOP в
+    pooled_connection) и открывается заново. Разрыв во время отправки сразу
+    не повторяется: сервер мог уже принять письмо. Такое письмо уходит на
+    обычный повтор с задержкой, поэтому доставка — «хотя бы один раз»:
+    в редком случае клиент получит письмо дважды.
+    """
+    connection, _ = pooled_connection()
+    started = time.perf_counter()
+    try:
+        connection.send_messages([build_message(email)])
+    except smtplib.SMTPServerDisconnected:
+        close_pooled_connection()
+        raise
+    return _elapsed_ms(started)
+
+
+def drain(limit=50, keep_open=False):
+    """Отправляет письма, срок которых наступил, пачками по BATCH_SIZE
+
+    send_messages вызывается по одному письму, чтобы ошибка относилась ровно
+    к одной записи и уже отправленные письма не уходили повторно; соединение
+    при этом одно на все письма. keep_open=True оставляет соединение открытым
+    для следующего прохода (постоянный обработчик).
+    """
+    emails = claim_due(limit)
+    if not emails:
+        return DrainResult(0, 0, 0, [])
+
+    try:
+        _, connect_ms = pooled_connection()
+    except Exception as e:
+        # SMTP недоступен — откладываем всю пачку
+        for email in emails:
+            _mark_failed_attempt(email, f"connect: {e!r}")
+        return DrainResult(0, len(emails), 0, [])
+
+    sent = retried = 0
+    timings = []
+    try:
+        for offset in range(0, len(emails), BATCH_SIZE):
+            delivered = []
+            for email in emails[offset:offset + BATCH_SIZE]:
+                try:
+                    email.send_ms = _send(email)
+                except Exception as e:
+                    _mark_failed_attempt(email, repr(e))
+                    retried += 1
+                    continue
+                email.attempts += 1
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                delivered.append(email)
+                timings.append(email.send_ms)
+                logger.debug(f"Outbox email {email.id} sent in {email.send_ms} ms")
+            OutboxEmail.objects.bulk_update(delivered, ['attempts', 'status', 'sent_at', 'last_error', 'send_ms'])
+            sent += len(delivered)
+    finally:
+        if not keep_open:
+            close_pooled_connection()
+
+    return DrainResult(sent, retried, connect_ms, timings)
@@ -0,0 +1,295 @@
+"""Уменьшенные копии изображений (renditions) для карточек, слайдеров и админки.
+
+Для каждого изображения создаются копии фиксированных ширин в WebP и JPEG
+рядом с оригиналом, в подпапке renditions/:
+    products/castle.jpg -> products/renditions/castle.480w.webp, ... .480w.jpg
+Копий шире оригинала нет: узкая картинка получает одну копию своего размера
+под ближайшей большей шириной. Какие копии есть и их настоящие ширины
+проверяются один раз и кешируются (rendition_widths), srcset строится по ним.
+Копии создаются при сохранении модели (сигнал в catalog.models) и командой
+`manage.py generate_renditions` для уже загруженных файлов. Пока копий нет,
+шаблоны показывают оригинал.
+
+Здесь же считается LQIP-заглушка — крошечная копия в data:-URI, которая
+хранится в модели и видна фоном <img>, пока грузится настоящая картинка.
+"""
+import base64
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Ширины для srcset; 160 — превью в админке и корзине
+RENDITION_WIDTHS = (160, 320, 480, 800, 1200)
+RENDITION_DIR = 'renditions'
+# (расширение, формат Pillow, параметры сохранения)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+READY_CACHE_TIMEOUT = 24 * 3600
+# «Копий нет» кешируем ненадолго: кеш у каждого процесса свой, и копии,
+# созданные другим процессом, должны появиться быстро
+NOT_READY_CACHE_TIMEOUT = 60
+# Сторона LQIP-заглушки: браузер растягивает её с размытием
+PLACEHOLDER_SIZE = 16
+# Расширение файла по настоящему формату изображения
+UPLOAD_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def rendition_name(name, width, ext):
+    """products/castle.jpg, 480, 'webp' -> products/renditions/castle.480w.webp"""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, RENDITION_DIR, f"{stem}.{width}w.{ext}").replace(os.sep, '/')
+
+
+def _ready_key(name):
+    return f"catalog:renditions:{name}"
+
+
+def _image_width(source):
+    with Image.open(source) as image:
+        return image.width
+
+
+def _unique_widths(found):
+    """[(ширина в имени, настоящая ширина)] без копий одинаковой ширины (остаётся меньшее имя)"""
+    widths, seen = [], set()
+    for width, actual in sorted(found):
+        if actual not in seen:
+            seen.add(actual)
+            widths.append((width, actual))
+    return tuple(widths)
+
+
+def _cache_widths(name, widths):
+    cache.set(_ready_key(name), widths, READY_CACHE_TIMEOUT if widths else NOT_READY_CACHE_TIMEOUT)
+
+
+def rendition_widths(field_file):
+    """Имеющиеся копии файла: ((ширина в имени, настоящая ширина), ...) по возрастанию
+
+    Результат кешируется; при промахе читаются только заголовки JPEG-копий.
+    """
+    if not field_file:
+        return ()
+    key = _ready_key(field_file.name)
+    widths = cache.get(key)
+    if widths is None:
+        found = []
+        for width in RENDITION_WIDTHS:
+            try:
+                with field_file.storage.open(rendition_name(field_file.name, width, 'jpg'), 'rb') as source:
+                    found.append((width, _image_width(source)))
+            except (OSError, ValueError, Image.DecompressionBombError):
+                continue
+        widths = _unique_widths(found)
+        _cache_widths(field_file.name, widths)
+    return widths
+
+
+def renditions_ready(field_file):
+    """Есть ли копии для файла"""
+    return bool(rendition_widths(field_file))
+
+
+def _encode(image, pil_format, save_options):
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **save_options)
+    return buffer.getvalue()
+
+
+def render_image(source, widths=RENDITION_WIDTHS):
+    """Байты копий из открытого файла изображения: {(ширина, расширение): bytes}
+
+    Не зависит от хранилища и моделей, поэтому годится и для пула процессов.
+    Больше оригинала не увеличиваем: ширины не меньше исходной заменяются одной
+    копией исходного размера под ближайшей из них (у картинки 650px: 160, 320,
+    480 и «800w» шириной 650).
+    Каждая ширина уменьшается из предыдущей, большей, а JPEG сразу декодируется
+    в уменьшенном виде (draft) — крупные фото обрабатываются в разы быстрее.
+    """
+    with Image.open(source) as image:
+        image.draft('RGB', (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+        smaller = [width for width in widths if width < image.width]
+        wider = [width for width in widths if width >= image.width]
+        rendered = {}
+        current = image
+        for width in sorted(smaller + wider[:1], reverse=True):
+            if current.width > width:
+                current = current.resize((width, max(round(current.height * width / current.width), 1)), Image.LANCZOS)
+            for ext, pil_format, save_options in FORMATS:
+                rendered[(width, ext)] = _encode(current, pil_format, save_options)
+        return rendered
+
+
+def render_placeholder(image):
+    """data:-URI WebP-копии PLACEHOLDER_SIZE px (около 200 байт) из открытого изображения
+
+    Для прозрачных изображений возвращает '' — заглушка просвечивала бы
+    сквозь картинку и после её загрузки.
+    """
+    image.draft('RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGBA')
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.LANCZOS)
+    if image.mode == 'RGBA':
+        if image.getchannel('A').getextrema()[0] < 255:
+            return ''
+        image = image.convert('RGB')
+    data = _encode(image, 'WEBP', {'quality': 50})
+    return f"data:image/webp;base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _read_metadata(image):
+    width, height = image.size
+    return {'width': width, 'height': height, 'placeholder': render_placeholder(image)}
+
+
+def field_file_metadata(field_file):
+    """Размеры и заглушка файла ImageField — только что загруженного или уже сохранённого
+
+    Возвращает None, если файла нет или он не читается: сохранение записи
+    из-за этого не падает, поля просто остаются пустыми.
+    """
+    try:
+        if not field_file._committed:
+            # Загрузка из формы: файл ещё не в хранилище, после чтения он снова с начала
+            source = field_file.file
+            source.seek(0)
+            try:
+                with Image.open(source) as image:
+                    return _read_metadata(image)
+            finally:
+                source.seek(0)
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            with Image.open(source) as image:
+                return _read_metadata(image)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Cannot read {field_file.name}: {e}")
+        return None
+
+
+def image_metadata(path):
+    """Размеры и заглушка файла по пути (для пула процессов, как prepare_upload)
+
+    Размеры — как у Image.size: без учёта EXIF-поворота.
+    """
+    try:
+        with Image.open(path) as image:
+            return {'path': path, **_read_metadata(image)}
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+
+
+def file_sha256(path):
+    """SHA-256 файла по пути; None, если файл не читается (для пула процессов)"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def prepare_upload(path):
+    """Хеш, настоящий тип и копии файла перед загрузкой
+
+    Выполняется в пуле процессов, поэтому не трогает Django: только файл и Pillow.
+    Возвращает словарь с data, sha256, mime, extension, width, height,
+    placeholder, renditions или с error.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        with Image.open(BytesIO(data)) as image:
+            image_format = image.format
+            if image_format not in UPLOAD_EXTENSIONS:
+                return {'path': path, 'error': f"unsupported format {image_format}"}
+            metadata = _read_metadata(image)
+        return {
+            'path': path,
+            'data': data,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'mime': Image.MIME[image_format],
+            'extension': UPLOAD_EXTENSIONS[image_format],
+            **metadata,
+            'renditions': render_image(BytesIO(data)),
+        }
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+
+
+def save_renditions(storage, name, rendered):
+    """Записывает копии рядом с оригиналом (существующие заменяются, лишние удаляются)"""
+    delete_renditions(storage, name, keep=rendered)
+    for (width, ext), data in rendered.items():
+        target = rendition_name(name, width, ext)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(data))
+    _cache_widths(name, _unique_widths(
+        (width, _image_width(BytesIO(data))) for (width, ext), data in rendered.items() if ext == 'jpg'
+    ))
+
+
+def delete_renditions(storage, name, keep=()):
+    """Удаляет копии файла, кроме keep — ключей (ширина, расширение); оригинал не трогает"""
+    for width in RENDITION_WIDTHS:
+        for ext, _, _ in FORMATS:
+            target = rendition_name(name, width, ext)
+            if (width, ext) not in keep and storage.exists(target):
+                storage.delete(target)
+    cache.delete(_ready_key(name))
+
+
+def generate_renditions(field_file, force=False):
+    """Создаёт копии для файла ImageField; возвращает True, если что-то создано"""
+    if not field_file:
+        return False
+    storage = field_file.storage
+    # Самая узкая копия есть всегда (для маленьких картинок — единственная)
+    if not force and storage.exists(rendition_name(field_file.name, RENDITION_WIDTHS[0], 'jpg')):
+        return False
+    try:
+        with storage.open(field_file.name, 'rb') as source:
+            rendered = render_image(source)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Cannot render {field_file.name}: {e}")
+        return False
+    save_renditions(storage, field_file.name, rendered)
+    return True
+
+
+def rendition_url(field_file, width, ext='jpg'):
+    """URL копии нужной ширины (ближайшей не меньше, иначе самой большой); оригинал, если копий ещё нет"""
+    widths = rendition_widths(field_file)
+    if not widths:
+        return field_file.url
+    fitting = [name_width for name_width, actual in widths if actual >= width] or [widths[-1][0]]
+    return field_file.storage.url(rendition_name(field_file.name, fitting[0], ext))
+
+
+def srcset(field_file, ext='jpg'):
+    """'…160w.jpg 160w, …320w.jpg 320w, …' для атрибута srcset — только имеющиеся копии, с настоящей шириной"""
+    storage = field_file.storage
+    return ', '.join(
+        f"{storage.url(rendition_name(field_file.name, name_width, ext))} {actual}w"
+        for name_width, actual in rendition_widths(field_file)
+    )
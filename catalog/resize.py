@@ -0,0 +1,103 @@
+"""Уменьшение изображений по запросу: /img/r/<w>x<h>/<path>?s=<подпись>.
+
+Размеры задаются прямо в URL, поэтому дизайнер может поменять размер карточки
+без пересоздания копий. URL подписан HMAC (SECRET_KEY), иначе эндпоинт можно
+было бы заставить делать любые размеры. 0 в одном из размеров — «по пропорции»;
+оба размера — кадрирование по центру под заданную рамку (как object-cover).
+
+Результат один раз пишется на диск: MEDIA_ROOT/r/<w>x<h>/<path>, дальше
+Django отдаёт готовый файл через FileResponse с годовым Cache-Control.
+Эндпоинт намеренно не под /media/: на PythonAnywhere /media/ — статическое
+отображение, и промах кеша до Django бы не дошёл (404). Если перед сайтом
+стоит nginx, готовые файлы можно отдавать без Django:
+location /img/r/ { alias <MEDIA_ROOT>/r/; try_files $uri @django; }
+(для @django оставьте исходный путь запроса).
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare
+from PIL import Image, ImageOps
+
+SALT = 'catalog.resize'
+MAX_DIMENSION = 2400
+RESIZE_DIR = 'r'
+# Формат результата — по расширению оригинала
+FORMATS = {
+    '.jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    '.jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    '.png': ('PNG', {'optimize': True}),
+    '.webp': ('WEBP', {'quality': 80}),
+}
+
+
+def _signature(width, height, name):
+    return signing.Signer(salt=SALT).signature(f"{width}x{height}/{name}")
+
+
+def check_signature(width, height, name, signature):
+    return bool(signature) and constant_time_compare(signature, _signature(width, height, name))
+
+
+def resized_url(name, width, height=0):
+    """Подписанный URL уменьшенной копии файла из MEDIA_ROOT"""
+    url = reverse('resized_image', kwargs={'width': width, 'height': height, 'name': name})
+    return f"{url}?s={_signature(width, height, name)}"
+
+
+def cache_path(width, height, name):
+    return safe_join(settings.MEDIA_ROOT, RESIZE_DIR, f"{width}x{height}", name)
+
+
+def _resize(image, width, height):
+    image = ImageOps.exif_transpose(image)
+    if width and height:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    if width and image.width > width:
+        return image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+    if height and image.height > height:
+        return image.resize((max(round(image.width * height / image.height), 1), height), Image.LANCZOS)
+    return image
+
+
+def resized_file(width, height, name):
+    """Путь к уменьшенной копии; создаёт её при первом обращении
+
+    Бросает FileNotFoundError, если оригинала нет, ValueError для
+    неподдерживаемого формата, SuspiciousFileOperation для пути вне MEDIA_ROOT.
+    """
+    if name.startswith(f"{RESIZE_DIR}/"):
+        raise ValueError('Resized images cannot be resized again')
+    target = cache_path(width, height, name)
+    if os.path.exists(target):
+        return target
+
+    source = safe_join(settings.MEDIA_ROOT, name)
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported image type: {extension}")
+    pil_format, save_options = FORMATS[extension]
+
+    with Image.open(source) as image:
+        # JPEG декодируется сразу уменьшенным, но не меньше запрошенной рамки
+        image.draft('RGB', (width or 1, height or 1))
+        result = _resize(image, width, height)
+        if pil_format == 'JPEG' and result.mode != 'RGB':
+            result = result.convert('RGB')
+
+        # Пишем во временный файл и переименовываем: параллельный запрос
+        # никогда не увидит недописанную картинку
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                result.save(f, pil_format, **save_options)
+            os.replace(temp_path, target)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    return target
@@ -0,0 +1,66 @@
+"""Хранилище изображений по содержимому (content-addressed).
+
+Имя файла — SHA-256 его содержимого: img/ab/abcdef….jpg. Одно и то же фото,
+загруженное в товар, в доп. изображения и повторно через админку, лежит на
+диске один раз, а у браузера — одна запись в кеше. Уменьшенные копии
+(catalog.renditions) тоже общие.
+
+Файлы могут принадлежать нескольким записям, поэтому удалять их можно, только
+убедившись, что на них больше никто не ссылается (см. migrate_media_to_cas).
+Старые файлы переносит `manage.py migrate_media_to_cas`.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CAS_DIR = 'img'
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def content_name(digest, original_name):
+    """img/ab/<sha256>.<расширение оригинала>"""
+    extension = os.path.splitext(original_name)[1].lower()
+    if extension == '.jpeg':
+        extension = '.jpg'
+    return f"{CAS_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage (MEDIA_ROOT), где имя файла задаёт его содержимое"""
+
+    content_addressed = True
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        # Имена внутри img/ уже заданы хранилищем (копии из catalog.renditions
+        # лежат рядом с оригиналом) — пишем их как есть
+        if name.startswith(f"{CAS_DIR}/"):
+            return super().save(name, content, max_length)
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = content_name(content_hash(content), name)
+        # Такое содержимое уже есть — второй копии не пишем
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    """Для storage= у ImageField (вызываемый объект не тянет настройки в миграции)"""
+    return image_storage
@@ -0,0 +1,67 @@
+from django import template
+from django.utils.html import format_html
+
+from catalog.renditions import rendition_url, renditions_ready, srcset
+from catalog.resize import resized_url
+
+register = template.Library()
+
+# Карточка в сетке: 4 колонки на десктопе, 2 на планшете, 1 на телефоне
+CARD_SIZES = '(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw'
+
+
+@register.filter
+def rendition(field_file, width):
+    """{{ product.image|rendition:480 }} — URL уменьшенной JPEG-копии"""
+    return rendition_url(field_file, int(width)) if field_file else ''
+
+
+@register.filter
+def resized(field_file, size):
+    """{{ product.image|resized:"480x320" }} — подписанный URL копии любого размера (0 — по пропорции)"""
+    if not field_file:
+        return ''
+    width, _, height = str(size).partition('x')
+    return resized_url(field_file.name, int(width or 0), int(height or 0))
+
+
+def _layout_attrs(field_file):
+    """width/height и фон-заглушка из полей модели (<поле>_width, _height, _placeholder) — файл не читается"""
+    name, instance = field_file.field.name, field_file.instance
+    width = getattr(instance, f"{name}_width", None)
+    height = getattr(instance, f"{name}_height", None)
+    placeholder = getattr(instance, f"{name}_placeholder", '')
+    # Размеры в атрибутах задают пропорции — место под картинку занято до загрузки
+    size = format_html(' width="{}" height="{}"', width, height) if width and height else ''
+    # Заглушка растягивается как object-cover и скрывается под загруженной картинкой
+    background = format_html(
+        ' style="background: url({}) center / cover no-repeat"', placeholder
+    ) if placeholder else ''
+    return size, background
+
+
+@register.simple_tag
+def responsive_image(field_file, alt='', css_class='', sizes=CARD_SIZES, width=480, loading='lazy'):
+    """<picture> с WebP и JPEG srcset; без копий — обычный <img> с оригиналом
+
+    {% responsive_image product.image product.title "w-full h-48 object-cover" %}
+    width — ширина для src у браузеров без srcset. Если у модели есть размеры
+    и LQIP-заглушка, <img> получает width/height и фон из заглушки.
+    """
+    if not field_file:
+        return ''
+    size, background = _layout_attrs(field_file)
+    if not renditions_ready(field_file):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}"{}{}>',
+            field_file.url, alt, css_class, loading, size, background,
+        )
+    # display: contents — <picture> не влияет на вёрстку, классы работают как у <img>
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async"{}{}>'
+        '</picture>',
+        srcset(field_file, 'webp'), sizes,
+        rendition_url(field_file, width), srcset(field_file), sizes, alt, css_class, loading, size, background,
+    )
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from .booking_sync import current_sync_token, parse_sync_token
+
+
+class SyncTokenTests(TestCase):
+    def test_current_token_round_trips(self):
+        issued_at, last_deleted = parse_sync_token(current_sync_token())
+        self.assertEqual(last_deleted, 0)
+
+    def test_out_of_range_token_is_value_error(self):
+        for token in ['9' * 30 + '-0', '1-' + '9' * 30, 'abc-0', '1700000000000000']:
+            with self.subTest(token=token[:20]):
+                with self.assertRaises(ValueError):
+                    parse_sync_token(token)
+
+    def test_changes_with_out_of_range_token_is_bad_request(self):
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get('/katalog/admin/bookings/changes/', {'since': '9' * 30 + '-0'})
+
+        self.assertEqual(response.status_code, 400)
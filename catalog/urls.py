@@ -11,6 +11,11 @@ urlpatterns = [
     # Управление бронированиями (только для администраторов)
     path('admin/bookings/', views.booking_management, name='booking_management'),
     path('admin/bookings/data/', views.get_bookings_data, name='get_bookings_data'),
+    path('admin/bookings/changes/', views.get_bookings_changes, name='get_bookings_changes'),
+    path('admin/bookings/events/', views.booking_event_stream, name='booking_event_stream'),
+    path('admin/bookings/kalender.ics', views.bookings_ics, name='bookings_ics'),
+    path('admin/bookings/kalender-token/', views.rotate_bookings_ics_token, name='rotate_bookings_ics_token'),
+    path('admin/bookings/matrix/', views.get_occupancy_matrix, name='get_occupancy_matrix'),
     path('admin/bookings/create/', views.create_booking, name='create_booking'),
     path('admin/bookings/<int:booking_id>/', views.update_booking, name='update_booking'),
     
@@ -18,4 +23,6 @@ urlpatterns = [
     path('', views.catalog_index, name='catalog_index'),
     path('<slug:slug>/', views.category_detail, name='category_detail'),
     path('produkt/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('produkt/<slug:slug>/verfuegbarkeit/', views.product_availability, name='product_availability'),
+    path('produkt/<slug:slug>/kalender.ics', views.product_ics, name='product_ics'),
 ] 
\ No newline at end of file
@@ -1,12 +1,33 @@
 from datetime import timedelta, date
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse, HttpResponse, HttpResponseForbidden, FileResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag, urlencode
+import hashlib
 import json
 from .models import Product, Category, Availability, Booking, News, MissingProduct
+from .availability import (
+    BLOCKING_STATUSES, get_occupancy, month_window, availability_version, occupancy_matrix,
+    lock_product, find_conflicts, filter_available,
+)
+from .booking_sync import current_sync_token, parse_sync_token, is_token_expired, changes_since, record_deleted
+from .booking_events import get_hub, notify_booking_change, event_stream
+from .ics import (
+    product_feed, bookings_feed, bookings_feed_token, check_bookings_feed_token, rotate_bookings_feed_token,
+)
+from .resize import MAX_DIMENSION, check_signature, resized_file
+from PIL import UnidentifiedImageError
 
 
 def catalog_index(request):
@@ -26,6 +47,21 @@ def catalog_index(request):
     if search_query:
         products = products.filter(title__icontains=search_query)
     
+    # Только свободные в выбранный период (если указан)
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date') or start_date
+    if start_date:
+        try:
+            from datetime import datetime
+            start = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end = datetime.strptime(end_date, '%Y-%m-%d').date()
+            if end < start:
+                start, end = end, start
+            products = filter_available(products, start, end)
+            start_date, end_date = start.isoformat(), end.isoformat()
+        except ValueError:
+            start_date = end_date = None
+    
     # Сортировка
     sort_by = request.GET.get('sort', 'title')
     if sort_by == 'price':
@@ -41,6 +77,8 @@ def catalog_index(request):
         'selected_category': selected_category,
         'search_query': search_query,
         'sort_by': sort_by,
+        'start_date': start_date,
+        'end_date': end_date,
     }
     
     return render(request, 'catalog/all_products.html', context)
@@ -78,6 +116,38 @@ def news_detail(request, slug):
     return render(request, 'catalog/news_detail.html', context)
 
 
+UPCOMING_DAYS = 14
+
+
+def upcoming_bookings_queryset(today, product_id=None, days=UPCOMING_DAYS):
+    """Ближайшие брони (начало в ближайшие days дней) для списка на странице управления"""
+    bookings = Booking.objects.select_related('product').filter(
+        start_date__gte=today,
+        start_date__lte=today + timedelta(days=days)
+    ).order_by('start_date', 'product__title')
+    if product_id is not None:
+        bookings = bookings.filter(product_id=product_id)
+    return bookings
+
+
+def calendar_bookings(product_id=None, start=None, end=None):
+    """Брони для календаря: товар и видимый диапазон [start, end] необязательны"""
+    bookings = Booking.objects.all()
+    if product_id is not None:
+        bookings = bookings.filter(product_id=product_id)
+    if start is not None and end is not None:
+        bookings = bookings.filter(
+            start_date__lte=end,   # бронь началась до конца видимого диапазона
+            end_date__gte=start    # бронь закончилась после начала видимого диапазона
+        )
+    return bookings
+
+
+def calendar_event_rows(bookings):
+    """Строки .values(*BOOKING_EVENT_FIELDS) для событий календаря"""
+    return bookings.order_by().values(*BOOKING_EVENT_FIELDS)
+
+
 @staff_member_required
 def booking_management(request):
     """Страница управления бронированиями с календарем"""
@@ -89,31 +159,73 @@ def booking_management(request):
     selected_product = request.GET.get('product')
     
     # Ближайшие брони (по умолчанию на 14 дней вперед)
-    today = date.today()
-    upcoming_end = today + timedelta(days=14)
-    
-    upcoming_bookings = Booking.objects.select_related('product').filter(
-        start_date__gte=today,
-        start_date__lte=upcoming_end
-    ).order_by('start_date', 'product__title')
-    
+    product_id = None
     if selected_product:
         try:
-            product_id_int = int(selected_product)
-            upcoming_bookings = upcoming_bookings.filter(product_id=product_id_int)
+            product_id = int(selected_product)
         except ValueError:
             pass
+    upcoming_bookings = upcoming_bookings_queryset(date.today(), product_id)
     
     context = {
         'products': products,
         'selected_product': selected_product,
         'upcoming_bookings': upcoming_bookings,
-        'upcoming_days': 14,
+        'upcoming_days': UPCOMING_DAYS,
+        'bookings_ics_url': request.build_absolute_uri(
+            reverse('catalog:bookings_ics') + '?' + urlencode({'token': bookings_feed_token(request.user)})
+        ),
     }
     
     return render(request, 'catalog/booking_management.html', context)
 
 
+def _parse_calendar_date(value):
+    """FullCalendar передаёт ISO с временем (2026-06-01T00:00:00) — берём только дату"""
+    from datetime import datetime
+    return datetime.strptime(value.split('T')[0].strip()[:10], '%Y-%m-%d').date()
+
+
+# Поля брони, которые нужны календарю (без загрузки моделей целиком)
+BOOKING_EVENT_FIELDS = (
+    'id', 'customer_name', 'customer_email', 'customer_phone', 'start_date', 'end_date',
+    'total_price', 'status', 'notes', 'product_id', 'product__title',
+)
+
+
+def _booking_event(row, color_map=Booking.STATUS_COLORS, one_day=timedelta(days=1)):
+    """Событие FullCalendar из строки .values(*BOOKING_EVENT_FIELDS)"""
+    color = color_map.get(row['status'], Booking.DEFAULT_COLOR)
+    return {
+        'id': row['id'],
+        'title': f"{row['customer_name']} - {row['product__title']}",
+        'start': row['start_date'].isoformat(),
+        'end': (row['end_date'] + one_day).isoformat(),  # +1 день для корректного отображения
+        'allDay': True,  # без времени — не сдвигается по часовому поясу
+        'backgroundColor': color,
+        'borderColor': color,
+        'extendedProps': {
+            'customer_name': row['customer_name'],
+            'customer_email': row['customer_email'],
+            'customer_phone': row['customer_phone'],
+            'product_id': row['product_id'],
+            'product_title': row['product__title'],
+            'total_price': str(row['total_price']),
+            'status': row['status'],
+            'notes': row['notes'],
+            'duration_days': (row['end_date'] - row['start_date']).days + 1,
+        }
+    }
+
+
+def _booking_events(rows):
+    """Потоково отдаёт JSON-массив событий FullCalendar"""
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(_booking_event(row))
+    yield ']'
+
+
 @staff_member_required
 @csrf_exempt
 def get_bookings_data(request):
@@ -125,63 +237,172 @@ def get_bookings_data(request):
     end_date = request.GET.get('end')
     
     # Фильтруем бронирования
-    bookings = Booking.objects.select_related('product')
-    
-    if product_id and product_id != '':
-        try:
-            product_id = int(product_id)
-            bookings = bookings.filter(product_id=product_id)
-        except ValueError:
-            pass
+    try:
+        product_id = int(product_id) if product_id else None
+    except ValueError:
+        product_id = None
     
+    start_date_obj = end_date_obj = None
     if start_date and end_date:
         try:
-            from datetime import datetime
-            # FullCalendar передаёт ISO с временем (2026-06-01T00:00:00) — берём только дату
-            start_date_clean = start_date.split('T')[0].strip()[:10]
-            end_date_clean = end_date.split('T')[0].strip()[:10]
-            start_date_obj = datetime.strptime(start_date_clean, '%Y-%m-%d').date()
-            end_date_obj = datetime.strptime(end_date_clean, '%Y-%m-%d').date()
-            bookings = bookings.filter(
-                start_date__lte=end_date_obj,   # бронь началась до конца видимого диапазона
-                end_date__gte=start_date_obj    # бронь закончилась после начала видимого диапазона
-            )
+            start_date_obj = _parse_calendar_date(start_date)
+            end_date_obj = _parse_calendar_date(end_date)
         except (ValueError, IndexError):
-            pass
+            start_date_obj = end_date_obj = None
     
-    # Формируем данные для календаря
-    events = []
-    for booking in bookings:
-        # Определяем цвет в зависимости от статуса
-        color_map = {
-            'pending': '#ffc107',      # Желтый
-            'confirmed': '#28a745',    # Зеленый
-            'cancelled': '#dc3545',    # Красный
-            'completed': '#6c757d',    # Серый
-        }
-        
-        events.append({
-            'id': booking.id,
-            'title': f"{booking.customer_name} - {booking.product.title}",
-            'start': booking.start_date.isoformat(),
-            'end': (booking.end_date + timedelta(days=1)).isoformat(),  # +1 день для корректного отображения
-            'allDay': True,  # без времени — не сдвигается по часовому поясу
-            'backgroundColor': color_map.get(booking.status, '#007bff'),
-            'borderColor': color_map.get(booking.status, '#007bff'),
-            'extendedProps': {
-                'customer_name': booking.customer_name,
-                'customer_email': booking.customer_email,
-                'customer_phone': booking.customer_phone,
-                'product_id': booking.product.id,
-                'product_title': booking.product.title,
-                'total_price': str(booking.total_price),
-                'status': booking.status,
-                'notes': booking.notes,
-                'duration_days': booking.duration_days,
-            }
-        })
+    bookings = calendar_bookings(product_id, start_date_obj, end_date_obj)
+    
+    # Версия выборки: последнее изменение и количество (удаление тоже меняет ETag)
+    version = bookings.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    etag = quote_etag(hashlib.md5(
+        f"{request.GET.urlencode()}:{version['last_modified']}:{version['count']}".encode('utf-8')
+    ).hexdigest())
+    last_modified = version['last_modified'].timestamp() if version['last_modified'] else None
+    
+    # Токен для инкрементальной синхронизации берём до выборки событий
+    sync_token = current_sync_token()
+    
+    # Ничего не изменилось — 304 без выборки и сериализации
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        rows = calendar_event_rows(bookings).iterator()
+        response = StreamingHttpResponse(_booking_events(rows), content_type='application/json')
+    
+    response['ETag'] = etag
+    response['X-Sync-Token'] = sync_token
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@staff_member_required
+def get_bookings_changes(request):
+    """API инкрементальной синхронизации: брони, изменённые/удалённые после ?since=<токен>"""
+    product_id = request.GET.get('product') or None
+    try:
+        if product_id is not None:
+            product_id = int(product_id)
+        issued_at, _ = parse_sync_token(request.GET.get('since', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Ungültiger Synchronisierungstoken'}, status=400)
+    
+    sync_token = current_sync_token()
+    
+    # Следы удалений уже почищены — клиент должен загрузить календарь заново
+    if is_token_expired(issued_at):
+        return JsonResponse({'reset': True, 'sync_token': sync_token})
     
-    return JsonResponse(events, safe=False)
+    changed, deleted = changes_since(request.GET['since'], product_id)
+    rows = calendar_event_rows(changed)
+    
+    return JsonResponse({
+        'reset': False,
+        'sync_token': sync_token,
+        'changed': [_booking_event(row) for row in rows],
+        'deleted': deleted,
+    })
+
+
+async def booking_event_stream(request):
+    """SSE-поток изменений броней для календаря администратора (только под ASGI)"""
+    is_staff = await sync_to_async(lambda: request.user.is_active and request.user.is_staff)()
+    if not is_staff:
+        return HttpResponseForbidden()
+    
+    # Под WSGI бесконечный поток занял бы рабочий процесс; 204 останавливает
+    # переподключения EventSource, и календарь остаётся на периодической синхронизации
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    queue = get_hub().subscribe()
+    response = StreamingHttpResponse(event_stream(queue), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать поток
+    return response
+
+
+def _ics_response(request, feed, private):
+    """Отдаёт закешированный фид; 304, если у клиента та же версия"""
+    etag, body = feed
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="kalender.ics"'
+    response['ETag'] = etag
+    if private:
+        patch_cache_control(response, private=True, max_age=300)
+    else:
+        patch_cache_control(response, public=True, max_age=300)
+    return response
+
+
+@require_GET
+def bookings_ics(request):
+    """iCalendar-фид всех броней: для сотрудников или по личному токену сотрудника"""
+    is_staff = request.user.is_active and request.user.is_staff
+    if not is_staff and not check_bookings_feed_token(request.GET.get('token', '')):
+        return HttpResponseForbidden()
+    return _ics_response(request, bookings_feed(), private=True)
+
+
+@staff_member_required
+@require_POST
+def rotate_bookings_ics_token(request):
+    """Новая ссылка на фид для текущего сотрудника; старая перестаёт работать"""
+    rotate_bookings_feed_token(request.user)
+    return redirect('catalog:booking_management')
+
+
+@staff_member_required
+def get_occupancy_matrix(request):
+    """API матрицы занятости: все активные товары × дни диапазона (RLE)"""
+    try:
+        if request.GET.get('start'):
+            start_date = _parse_calendar_date(request.GET['start'])
+        else:
+            start_date = date.today()
+        if request.GET.get('end'):
+            end_date = _parse_calendar_date(request.GET['end'])
+        else:
+            end_date = start_date + timedelta(days=90)
+    except ValueError:
+        return JsonResponse({'error': 'Ungültiges Datum'}, status=400)
+
+    if end_date < start_date:
+        return JsonResponse({'error': 'Das Enddatum muss am oder nach dem Startdatum liegen'}, status=400)
+    # Не больше года за один запрос
+    end_date = min(end_date, start_date + timedelta(days=365))
+
+    # По умолчанию отменённые брони не занимают товар
+    valid_statuses = {value for value, _ in Booking.STATUS_CHOICES}
+    statuses = [s for s in request.GET.getlist('status') if s in valid_statuses]
+    if not statuses:
+        statuses = ['confirmed', 'pending', 'completed']
+
+    return JsonResponse({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'days': (end_date - start_date).days + 1,
+        'statuses': {
+            value: {
+                'label': label,
+                'color': Booking.STATUS_COLORS.get(value, Booking.DEFAULT_COLOR),
+            }
+            for value, label in Booking.STATUS_CHOICES
+        },
+        'products': occupancy_matrix(start_date, end_date, statuses),
+    })
+
+
+def _conflict_response(conflicts):
+    """Ответ 409 со списком пересекающихся броней"""
+    ids = ', '.join(f'#{booking_id}' for booking_id in conflicts)
+    return JsonResponse({
+        'success': False,
+        'error': f'Der Zeitraum überschneidet sich mit bestehenden Buchungen ({ids})',
+        'conflicts': conflicts,
+    }, status=409)
 
 
 @staff_member_required
@@ -215,20 +436,28 @@ def create_booking(request):
             
             # Рассчитываем количество дней и общую цену
             duration_days = (end_date - start_date).days + 1
-            total_price = product.price * duration_days if product.price else 0
+            total_price = Booking.calculate_total_price(product.price, start_date, end_date)
             
-            # Создаем новое бронирование
-            booking = Booking.objects.create(
-                product_id=data['product_id'],
-                customer_name=data['customer_name'],
-                customer_email=data['customer_email'],
-                customer_phone=data.get('customer_phone', ''),
-                start_date=start_date,
-                end_date=end_date,
-                total_price=total_price,
-                notes=data.get('notes', ''),
-                status='pending'
-            )
+            # Проверка пересечений и запись — в одной транзакции под блокировкой товара
+            with transaction.atomic():
+                lock_product(product.id)
+                conflicts = find_conflicts(product.id, start_date, end_date)
+                if conflicts:
+                    return _conflict_response(conflicts)
+                
+                # Создаем новое бронирование
+                booking = Booking.objects.create(
+                    product_id=data['product_id'],
+                    customer_name=data['customer_name'],
+                    customer_email=data['customer_email'],
+                    customer_phone=data.get('customer_phone', ''),
+                    start_date=start_date,
+                    end_date=end_date,
+                    total_price=total_price,
+                    notes=data.get('notes', ''),
+                    status='pending'
+                )
+                notify_booking_change('created', [booking])
             
             return JsonResponse({
                 'success': True,
@@ -257,39 +486,55 @@ def update_booking(request, booking_id):
         if request.method == 'PUT':
             data = json.loads(request.body)
             
-            # Преобразуем строки дат в объекты date
-            from datetime import datetime
-            date_changed = False
-            if 'start_date' in data:
-                new_start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
-                if new_start_date != booking.start_date:
-                    booking.start_date = new_start_date
-                    date_changed = True
+            with transaction.atomic():
+                # Блокируем товар и перечитываем бронь, чтобы не затереть параллельную правку
+                lock_product(booking.product_id)
+                booking.refresh_from_db()
+                
+                # Преобразуем строки дат в объекты date
+                from datetime import datetime
+                date_changed = False
+                if 'start_date' in data:
+                    new_start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+                    if new_start_date != booking.start_date:
+                        booking.start_date = new_start_date
+                        date_changed = True
+                        
+                if 'end_date' in data:
+                    new_end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+                    if new_end_date != booking.end_date:
+                        booking.end_date = new_end_date
+                        date_changed = True
+                
+                # Если даты изменились, пересчитываем цену
+                if date_changed:
+                    if booking.end_date < booking.start_date:
+                        return JsonResponse({
+                            'success': False,
+                            'error': 'Das Enddatum muss am oder nach dem Startdatum liegen'
+                        }, status=400)
                     
-            if 'end_date' in data:
-                new_end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
-                if new_end_date != booking.end_date:
-                    booking.end_date = new_end_date
-                    date_changed = True
-            
-            # Если даты изменились, пересчитываем цену
-            if date_changed:
-                if booking.end_date < booking.start_date:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Das Enddatum muss am oder nach dem Startdatum liegen'
-                    }, status=400)
+                    # Рассчитываем новую цену
+                    booking.total_price = Booking.calculate_total_price(
+                        booking.product.price, booking.start_date, booking.end_date
+                    )
                 
-                # Рассчитываем новую цену
-                duration_days = (booking.end_date - booking.start_date).days + 1
-                booking.total_price = booking.product.price * duration_days if booking.product.price else 0
-            
-            if 'status' in data:
-                booking.status = data['status']
-            if 'notes' in data:
-                booking.notes = data['notes']
-            
-            booking.save()
+                status_changed = 'status' in data and data['status'] != booking.status
+                if 'status' in data:
+                    booking.status = data['status']
+                if 'notes' in data:
+                    booking.notes = data['notes']
+                
+                # Проверяем пересечения, только если бронь занимает товар и что-то сдвинулось
+                if (date_changed or status_changed) and booking.status in BLOCKING_STATUSES:
+                    conflicts = find_conflicts(
+                        booking.product_id, booking.start_date, booking.end_date, exclude_id=booking.id
+                    )
+                    if conflicts:
+                        return _conflict_response(conflicts)
+                
+                booking.save()
+                notify_booking_change('updated', [booking])
             
             return JsonResponse({
                 'success': True,
@@ -299,7 +544,10 @@ def update_booking(request, booking_id):
             })
             
         elif request.method == 'DELETE':
-            booking.delete()
+            with transaction.atomic():
+                record_deleted([booking])
+                notify_booking_change('deleted', [booking])
+                booking.delete()
             return JsonResponse({
                 'success': True,
                 'message': 'Buchung erfolgreich gelöscht'
@@ -340,31 +588,87 @@ def product_detail(request, slug):
     # related_products содержит 4 случайных товара (без отсутствующих)
     related_products = list(additional_products)
 
-    # Занятые даты для календаря товара: минимум год вперёд, чтобы июнь светился при просмотре с февраля
+    # Занятость для календаря: сразу отдаём только текущий и следующий месяц,
+    # остальные месяцы календарь догружает через product_availability
     today = date.today()
-    end_date = today + timedelta(days=365)
-    
-    # Подтверждённые и ожидающие брони по этому товару
-    bookings = Booking.objects.filter(
-        product=product,
-        start_date__lte=end_date,   # бронь началась не позже конца окна
-        end_date__gte=today,       # бронь заканчивается не раньше сегодня
-        status__in=['confirmed', 'pending']
-    ).order_by('start_date')
-    
-    # Create list of booked dates for JavaScript
-    booked_dates = []
-    for booking in bookings:
-        current_date = booking.start_date
-        while current_date <= booking.end_date:
-            booked_dates.append(current_date.strftime('%Y-%m-%d'))
-            current_date += timedelta(days=1)
+    window_start, window_end = month_window(today.year, today.month, 2)
+    
+    # Подтверждённые/ожидающие брони и блокировки — склеенными интервалами
+    occupancy = get_occupancy(product.id, window_start, window_end)
 
     return render(request, 'catalog/product_detail.html', {
         'product': product,
         'related_products': related_products,
         'missing_products': missing_products,
         'additional_products': additional_products,
-        'booked_dates': json.dumps(booked_dates),
-        'bookings': bookings,
-    }) 
\ No newline at end of file
+        'booked_ranges': json.dumps(occupancy.as_ranges()),
+        'booked_ranges_start': window_start.isoformat(),
+        'booked_ranges_end': window_end.isoformat(),
+    }) 
+
+
+def _product_availability_version(request, slug):
+    """Версия занятости, считается один раз на запрос для ETag и Last-Modified"""
+    if not hasattr(request, '_availability_version'):
+        request._availability_version = availability_version(slug)
+    return request._availability_version
+
+
+@require_GET
+def product_ics(request, slug):
+    """iCalendar-фид занятости товара (без данных клиентов) для партнёров и водителей"""
+    feed = product_feed(slug)
+    if feed is None:
+        raise Http404
+    return _ics_response(request, feed, private=False)
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(
+    etag_func=lambda request, slug: _product_availability_version(request, slug)[1],
+    last_modified_func=lambda request, slug: _product_availability_version(request, slug)[0],
+)
+def product_availability(request, slug):
+    """API занятости товара по месяцам: ?month=YYYY-MM&months=N (N от 1 до 12)"""
+    product = get_object_or_404(Product.objects.only('id'), slug=slug, is_active=True)
+
+    try:
+        if request.GET.get('month'):
+            year, month = (int(part) for part in request.GET['month'].split('-')[:2])
+        else:
+            today = date.today()
+            year, month = today.year, today.month
+        months = min(max(int(request.GET.get('months', 1)), 1), 12)
+        start, end = month_window(year, month, months)
+    except ValueError:
+        return JsonResponse({'error': 'Ungültiger Monat'}, status=400)
+
+    occupancy = get_occupancy(product.id, start, end)
+
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'ranges': occupancy.as_ranges(),
+    })
+
+
+# Год: имя файла в кеше зависит от размеров и пути, содержимое по URL не меняется
+RESIZED_MAX_AGE = 365 * 24 * 3600
+
+
+@require_GET
+def resized_image(request, width, height, name):
+    """Уменьшенная копия изображения по подписанному URL (catalog.resize)"""
+    if not (width or height) or width > MAX_DIMENSION or height > MAX_DIMENSION:
+        raise Http404
+    if not check_signature(width, height, name, request.GET.get('s')):
+        return HttpResponseForbidden('Ungültige Signatur')
+    try:
+        path = resized_file(width, height, name)
+    except (FileNotFoundError, IsADirectoryError, UnidentifiedImageError, ValueError):
+        raise Http404
+    # FileResponse отдаёт файл через wsgi.file_wrapper (sendfile), без чтения в память
+    response = FileResponse(open(path, 'rb'))
+    patch_cache_control(response, public=True, max_age=RESIZED_MAX_AGE, immutable=True)
+    return response
@@ -0,0 +1,312 @@
+"""Корзина аренды в сессии.
+
+Формат (версия 2): session['cart'] = {'v': 2, 'items': [[product_id, start, end, price_cents], ...]},
+где start/end — порядковые номера дней (date.toordinal(), конец включительно),
+price_cents — цена за день в центах (None — взять цену товара при следующей загрузке).
+Ключ строки для клиента — f"{product_id}_{start}_{end}".
+
+Корзины версии 1 (словарь f"{product_id}_{start_date}_{end_date}" -> {product_id,
+start_date, end_date, price_per_day}, а ещё раньше — строки без дат) переводятся
+в версию 2 один раз, при первом обращении.
+
+Рядом в сессии хранится проверенное количество товаров для бейджа в шапке
+и время проверки: пока товары не менялись, бейдж рисуется без запросов к БД.
+
+Отправленная заявка сразу превращается в ожидающие брони (book_cart), связанные
+общим inquiry_id, — их видно в календаре и проверках доступности. Поэтому длина
+аренды и число строк ограничены (inquiry_limit_error): анонимная заявка не может
+занять товар на месяцы.
+"""
+import logging
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+
+from catalog.availability import find_range_conflicts, lock_product
+from catalog.booking_events import notify_booking_change
+from catalog.models import Booking, Product, products_version
+
+logger = logging.getLogger(__name__)
+
+CART_VERSION = 2
+
+CART_COUNT_KEY = 'cart_count'
+CART_COUNT_STAMP_KEY = 'cart_count_checked_at'
+
+# Ожидающие брони из заявки блокируют даты, пока администратор их не отменит
+MAX_RENTAL_DAYS = 14
+MAX_CART_LINES = 10
+
+DELIVERY_COST = Decimal('70.00')
+CENT = Decimal('0.01')
+
+
+def to_cents(price):
+    """Цена (Decimal, float, строка) в целые центы; 0 для Price auf Anfrage"""
+    if not price:
+        return 0
+    try:
+        cents = int((Decimal(str(price)) * 100).quantize(Decimal(1)))
+    except (InvalidOperation, ValueError):
+        return 0
+    return max(cents, 0)
+
+
+def from_cents(cents):
+    return (Decimal(cents or 0) / 100).quantize(CENT)
+
+
+def delivery_cost(delivery_option):
+    return DELIVERY_COST if delivery_option == 'delivery' else Decimal('0.00')
+
+
+def item_key(item):
+    product_id, start, end, _ = item
+    return f"{product_id}_{start}_{end}"
+
+
+def _upgrade_v1(cart_items):
+    """Строки версии 1 (и записи-строки без дат) в формат версии 2"""
+    items = []
+    for cart_key, cart_data in cart_items.items():
+        try:
+            if isinstance(cart_data, dict):
+                product_id = int(cart_data['product_id'])
+                start_date = cart_data.get('start_date')
+                end_date = cart_data.get('end_date')
+                price_cents = to_cents(cart_data.get('price_per_day', 0))
+            else:
+                product_id = int(cart_key)
+                start_date = end_date = None
+                price_cents = None
+            if start_date and end_date:
+                start = date.fromisoformat(start_date).toordinal()
+                end = date.fromisoformat(end_date).toordinal()
+            else:
+                # Без дат: сегодня, 1 день, цена товара
+                start = end = date.today().toordinal()
+                price_cents = None
+        except (KeyError, TypeError, ValueError):
+            logger.debug(f"Dropped unreadable cart entry: {cart_key}")
+            continue
+        items.append([product_id, start, end, price_cents])
+    return items
+
+
+def get_items(session):
+    """Строки корзины версии 2; старый формат переводится и сохраняется один раз"""
+    cart = session.get('cart')
+    if not cart:
+        return []
+    if isinstance(cart, dict) and cart.get('v') == CART_VERSION:
+        return cart['items']
+    items = _upgrade_v1(cart)
+    save_items(session, items)
+    return items
+
+
+def save_items(session, items):
+    session['cart'] = {'v': CART_VERSION, 'items': items}
+
+
+def add_item(session, product_id, start, end, price):
+    """Добавляет строку (даты — date); возвращает True, если такой строки ещё не было"""
+    item = [int(product_id), start.toordinal(), end.toordinal(), to_cents(price)]
+    items = get_items(session)
+    key = item_key(item)
+    is_new = True
+    for index, existing in enumerate(items):
+        if item_key(existing) == key:
+            items[index] = item
+            is_new = False
+            break
+    else:
+        items.append(item)
+    save_items(session, items)
+    return is_new
+
+
+def find_item(session, key):
+    for item in get_items(session):
+        if item_key(item) == key:
+            return item
+    return None
+
+
+def remove_item(session, key):
+    """Удаляет строку по ключу; возвращает True, если она была"""
+    items = get_items(session)
+    remaining = [item for item in items if item_key(item) != key]
+    if len(remaining) == len(items):
+        return False
+    save_items(session, remaining)
+    return True
+
+
+def update_item_dates(session, key, start, end):
+    """Меняет даты строки; возвращает строку или None, если её нет"""
+    items = get_items(session)
+    for item in items:
+        if item_key(item) == key:
+            item[1], item[2] = start.toordinal(), end.toordinal()
+            save_items(session, items)
+            return item
+    return None
+
+
+def item_subtotal(item):
+    """Стоимость строки (Decimal) без обращения к БД"""
+    _, start, end, price_cents = item
+    return from_cents((price_cents or 0) * (end - start + 1))
+
+
+def rental_total(items):
+    return sum((item_subtotal(item) for item in items), Decimal('0.00'))
+
+
+def load_cart(session):
+    """Строки корзины и сумма аренды; все товары загружаются одним запросом
+
+    Строки без цены получают цену товара, строки с неактивными или удалёнными
+    товарами удаляются. Сессия сохраняется, только если корзина изменилась.
+    """
+    items = get_items(session)
+    products = Product.objects.filter(is_active=True).in_bulk({item[0] for item in items})
+
+    lines = []
+    kept = []
+    changed = False
+    for item in items:
+        product = products.get(item[0])
+        if product is None:
+            logger.debug(f"Removed invalid item with key: {item_key(item)}")
+            changed = True
+            continue
+        if item[3] is None:
+            item[3] = to_cents(product.price)
+            changed = True
+        kept.append(item)
+
+        _, start, end, price_cents = item
+        start_date, end_date = date.fromordinal(start), date.fromordinal(end)
+        lines.append({
+            'id': product.id,
+            'product': product,
+            'title': product.title,
+            'price': product.price,
+            'image': product.image,
+            'cart_key': item_key(item),
+            'start': start_date,
+            'end': end_date,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'duration_days': end - start + 1,
+            'price_per_day': from_cents(price_cents),
+            'subtotal': item_subtotal(item),
+        })
+
+    if changed:
+        save_items(session, kept)
+
+    store_cart_count(session, len(lines))
+    return lines, rental_total(kept)
+
+
+def rental_days_error(start, end):
+    """Сообщение об ошибке, если аренда длиннее MAX_RENTAL_DAYS, иначе None"""
+    if (end - start).days + 1 > MAX_RENTAL_DAYS:
+        return (
+            f'Der Mietzeitraum darf höchstens {MAX_RENTAL_DAYS} Tage betragen. '
+            f'Für längere Mieten kontaktieren Sie uns bitte direkt.'
+        )
+    return None
+
+
+def inquiry_limit_error(lines):
+    """Сообщение об ошибке, если заявка превышает лимиты строк или длины аренды, иначе None"""
+    if len(lines) > MAX_CART_LINES:
+        return (
+            f'Eine Anfrage kann höchstens {MAX_CART_LINES} Positionen enthalten. '
+            f'Bitte entfernen Sie einige Produkte aus dem Warenkorb.'
+        )
+    for line in lines:
+        error = rental_days_error(line['start'], line['end'])
+        if error:
+            return f"{line['title']}: {error}"
+    return None
+
+
+def mark_conflicts(lines):
+    """Проверяет все строки корзины одним запросом к броням
+
+    Каждая строка получает 'conflicts' — занятые интервалы в её датах.
+    Возвращает True, если хотя бы одна строка недоступна.
+    """
+    conflicts = find_range_conflicts((line['id'], line['start'], line['end']) for line in lines)
+    for line, busy in zip(lines, conflicts):
+        line['conflicts'] = busy
+    return any(conflicts)
+
+
+def book_cart(lines, inquiry_id, customer_name, customer_email, customer_phone, notes=''):
+    """Ожидающие брони для всех строк корзины одним bulk_create
+
+    Вызывать внутри transaction.atomic(): товары блокируются (по возрастанию id,
+    чтобы параллельные заявки не ждали друг друга по кругу) и пересечения
+    перепроверяются под блокировкой. Возвращает (брони, []) или, если даты
+    уже заняты, ([], строки с конфликтами) — тогда ничего не записано.
+    """
+    for product_id in sorted({line['id'] for line in lines}):
+        lock_product(product_id)
+    if mark_conflicts(lines):
+        return [], [line for line in lines if line['conflicts']]
+
+    bookings = Booking.objects.bulk_create([
+        Booking(
+            product_id=line['id'],
+            customer_name=customer_name[:200],
+            customer_email=customer_email,
+            customer_phone=customer_phone[:20],
+            start_date=line['start'],
+            end_date=line['end'],
+            # Как в create_booking: текущая цена товара × дни
+            total_price=Booking.calculate_total_price(line['product'].price, line['start'], line['end']),
+            status='pending',
+            notes=notes,
+            inquiry_id=inquiry_id,
+        )
+        for line in lines
+    ])
+    notify_booking_change('created', bookings)
+    return bookings, []
+
+
+def format_ranges(ranges):
+    """Занятые интервалы для сообщений: 01.05.2027–03.05.2027, ..."""
+    return ', '.join(
+        start.strftime('%d.%m.%Y') if start == end else f"{start.strftime('%d.%m.%Y')}–{end.strftime('%d.%m.%Y')}"
+        for start, end in ranges
+    )
+
+
+def _count_is_fresh(session):
+    return session.get(CART_COUNT_STAMP_KEY, 0) >= products_version()
+
+
+def store_cart_count(session, count):
+    """Сохраняет проверенное количество; сессия пишется, только если оно изменилось или устарело"""
+    if session.get(CART_COUNT_KEY) != count or not _count_is_fresh(session):
+        session[CART_COUNT_KEY] = count
+        session[CART_COUNT_STAMP_KEY] = time.time()
+
+
+def cached_cart_count(session):
+    """Количество товаров в корзине; БД читается, только если товары менялись после проверки"""
+    if not session.get('cart'):
+        return 0
+    count = session.get(CART_COUNT_KEY)
+    if count is None or not _count_is_fresh(session):
+        lines, _ = load_cart(session)
+        return len(lines)
+    return count
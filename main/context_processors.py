@@ -0,0 +1,6 @@
+from .cart import cached_cart_count
+
+
+def cart(request):
+    """Количество товаров для бейджа корзины в шапке — рендерится вместе со страницей"""
+    return {'cart_badge_count': cached_cart_count(request.session)}
@@ -0,0 +1,133 @@
+"""Идемпотентная отправка форм (заявка из корзины, контактная форма).
+
+Клиент передаёт заголовок Idempotency-Key — случайный токен, один на отправку
+формы. Токен хранится в базе (catalog.IdempotencyKey) вместе с ключом сессии,
+поэтому повтор распознаётся на любом воркере и чужой токен из другой сессии
+ничего не даёт.
+
+Первый запрос сразу фиксирует строку-«заявку на выполнение» (уникальный индекс
+scope + key). Успешный ответ записывается в неё функцией complete() внутри
+транзакции самого view — вместе с бронями и письмами. Повтор получает тот же
+ответ (REPLAY_SECONDS), а пока первый запрос выполняется — сразу 409 с
+Retry-After, без ожидания. Ошибки не запоминаются: исправленную форму можно
+отправить с тем же токеном. Запросы без заголовка обрабатываются как раньше.
+"""
+import hashlib
+import json
+import re
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from catalog.models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_SECONDS = 3600
+# Через сколько незавершённая строка считается брошенной (процесс упал до commit)
+IN_PROGRESS_SECONDS = 60
+RETRY_AFTER_SECONDS = 2
+
+KEY_RE = re.compile(r'^[A-Za-z0-9_-]{8,100}$')
+
+IN_PROGRESS_MESSAGE = 'Ihre Anfrage wird bereits bearbeitet. Bitte warten Sie einen Moment.'
+
+
+def _key(request, token):
+    """SHA-256 от ключа сессии и токена: токен действует только в своей сессии"""
+    if request.session.session_key is None:
+        request.session.save()
+    return hashlib.sha256(f"{request.session.session_key}:{token}".encode()).hexdigest()
+
+
+def _replay(payload):
+    response = JsonResponse(payload)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _in_progress():
+    response = JsonResponse({'success': False, 'error': IN_PROGRESS_MESSAGE, 'message': IN_PROGRESS_MESSAGE}, status=409)
+    response['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+
+def _success_payload(response):
+    if response.status_code != 200:
+        return None
+    try:
+        payload = json.loads(response.content)
+    except (ValueError, AttributeError):
+        return None
+    return payload if isinstance(payload, dict) and payload.get('success') is True else None
+
+
+def _claim(scope, key):
+    """Строка-заявка для запроса или ответ на повтор (replay / 409)"""
+    now = timezone.now()
+    IdempotencyKey.objects.filter(created_at__lt=now - timedelta(seconds=REPLAY_SECONDS)).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(scope=scope, key=key, created_at=now), None
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if existing is None:
+        # Параллельный запрос только что завершился ошибкой и удалил строку
+        return None, _in_progress()
+    if existing.response is not None:
+        return None, _replay(existing.response)
+    if existing.created_at > now - timedelta(seconds=IN_PROGRESS_SECONDS):
+        return None, _in_progress()
+    # Брошенная строка: её транзакция не зафиксировалась, запрос можно выполнить заново
+    taken = IdempotencyKey.objects.filter(
+        pk=existing.pk, response__isnull=True, created_at=existing.created_at
+    ).update(created_at=now)
+    if not taken:
+        return None, _in_progress()
+    existing.created_at = now
+    return existing, None
+
+
+def complete(request, payload):
+    """Запоминает успешный ответ; вызывать внутри транзакции, которая создаёт заявку"""
+    claim = getattr(request, 'idempotency_claim', None)
+    if claim is not None:
+        IdempotencyKey.objects.filter(pk=claim.pk).update(response=payload)
+        claim.response = payload
+
+
+def idempotent(scope):
+    """Декоратор POST-view с JSON-ответом {'success': ...}; scope — имя формы"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = request.META.get(HEADER)
+            if request.method != 'POST' or not token:
+                return view(request, *args, **kwargs)
+            if not KEY_RE.match(token):
+                return JsonResponse({'success': False, 'error': 'Ungültiger Idempotency-Key'}, status=400)
+
+            claim, response = _claim(scope, _key(request, token))
+            if response is not None:
+                return response
+
+            request.idempotency_claim = claim
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                claim.delete()
+                raise
+
+            payload = _success_payload(response)
+            if payload is None:
+                claim.delete()
+            elif claim.response is None:
+                # View не вызвал complete() — запоминаем ответ после него
+                complete(request, payload)
+            return response
+        return wrapper
+    return decorator
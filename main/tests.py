@@ -0,0 +1,73 @@
+import json
+from datetime import date, timedelta
+
+from django.test import TestCase
+
+from catalog.models import Booking, Product
+from .cart import CART_VERSION, MAX_CART_LINES, MAX_RENTAL_DAYS
+
+
+class InquiryLimitsTests(TestCase):
+    """Анонимная заявка сразу создаёт блокирующие брони — лимиты проверяются до записи"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(title=f'Burg {i}', slug=f'burg-{i}', price=100)
+            for i in range(MAX_CART_LINES + 1)
+        ]
+        cls.start = date.today() + timedelta(days=30)
+
+    def set_cart(self, lines):
+        session = self.client.session
+        session['cart'] = {
+            'v': CART_VERSION,
+            'items': [[product.id, start.toordinal(), end.toordinal(), 10000] for product, start, end in lines],
+        }
+        session.save()
+
+    def send_inquiry(self):
+        response = self.client.post('/cart/send-inquiry/', json.dumps({
+            'customer_name': 'Test',
+            'customer_email': 'test@example.com',
+            'privacy_consent': True,
+        }), content_type='application/json')
+        return response.json()
+
+    def test_too_long_rental_is_not_booked(self):
+        end = self.start + timedelta(days=MAX_RENTAL_DAYS)
+        self.set_cart([(self.products[0], self.start, end)])
+
+        result = self.send_inquiry()
+
+        self.assertFalse(result['success'])
+        self.assertIn(str(MAX_RENTAL_DAYS), result['error'])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_too_many_lines_are_not_booked(self):
+        self.set_cart([(product, self.start, self.start) for product in self.products])
+
+        result = self.send_inquiry()
+
+        self.assertFalse(result['success'])
+        self.assertIn(str(MAX_CART_LINES), result['error'])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_inquiry_within_limits_is_booked(self):
+        end = self.start + timedelta(days=MAX_RENTAL_DAYS - 1)
+        self.set_cart([(product, self.start, end) for product in self.products[:MAX_CART_LINES]])
+
+        result = self.send_inquiry()
+
+        self.assertTrue(result['success'])
+        self.assertEqual(Booking.objects.filter(status='pending').count(), MAX_CART_LINES)
+
+    def test_add_to_cart_rejects_too_long_rental(self):
+        response = self.client.post('/cart/add/', json.dumps({
+            'product_id': self.products[0].id,
+            'start_date': self.start.isoformat(),
+            'end_date': (self.start + timedelta(days=MAX_RENTAL_DAYS)).isoformat(),
+        }), content_type='application/json')
+
+        self.assertFalse(response.json()['success'])
+        self.assertNotIn('cart', self.client.session)
@@ -20,6 +20,7 @@ urlpatterns = [
     path('cart/update-dates/', views.update_cart_dates, name='update_cart_dates'),
     path('cart/update-delivery/', views.update_delivery_option, name='update_delivery_option'),
     path('cart/update-delivery-details/', views.update_delivery_details, name='update_delivery_details'),
+    path('cart/batch/', views.update_cart_batch, name='update_cart_batch'),
     path('cart/send-inquiry/', views.send_inquiry, name='send_inquiry'),
     path('send-contact/', views.send_contact, name='send_contact'),
     path('cookie-richtlinie/', views.cookie_richtlinie, name='cookie_richtlinie'),
@@ -1,12 +1,21 @@
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
-from django.core.mail import send_mail, EmailMessage, EmailMultiAlternatives
-from django.conf import settings
+from django.db import transaction
 from django.utils.encoding import force_str
 import json
 import logging
+import uuid
 from catalog.models import Product
 from datetime import datetime, date
+from .cart import (
+    load_cart, cached_cart_count, store_cart_count, get_items, save_items, add_item, remove_item,
+    update_item_dates, item_subtotal, rental_total, delivery_cost as get_delivery_cost,
+    find_item, mark_conflicts, format_ranges, book_cart, item_key,
+    inquiry_limit_error, rental_days_error, MAX_CART_LINES,
+)
+from catalog.availability import find_range_conflicts
+from catalog.outbox import queue_email
+from .idempotency import complete, idempotent
 
 def format_date_dmy(date_str):
     """Преобразует дату из формата YYYY-MM-DD в DD-MM-YYYY"""
@@ -61,7 +70,6 @@ def home(request):
 
 def cart(request):
     """Страница корзины для аренды по дням"""
-    cart_items = request.session.get('cart', {})
     # По умолчанию всегда Selbstabholung, если не выбран другой способ
     delivery_option = request.session.get('delivery_option', 'pickup')
     
@@ -69,113 +77,13 @@ def cart(request):
     if 'delivery_option' not in request.session:
         request.session['delivery_option'] = 'pickup'
         delivery_option = 'pickup'
-    products = []
-    total_price = 0.0
-    
-    for cart_key, cart_data in cart_items.items():
-        try:
-            logger.debug(f"Processing cart_key = {cart_key}, cart_data = {cart_data}")
-            
-            # Проверяем, является ли это новым форматом корзины с датами
-            if isinstance(cart_data, dict):
-                product_id = cart_data['product_id']
-                start_date = cart_data.get('start_date')
-                end_date = cart_data.get('end_date')
-                price_per_day = cart_data.get('price_per_day', 0)
-                logger.debug(f"New format - product_id = {product_id}, start_date = {start_date}, end_date = {end_date}, price_per_day = {price_per_day}")
-            else:
-                # Старый формат (только product_id и quantity) - конвертируем
-                product_id = cart_key
-                start_date = None
-                end_date = None
-                price_per_day = 0
-                logger.debug(f"Old format - product_id = {product_id}")
-            
-            logger.debug(f"Trying to get product with id = {product_id}")
-            product = Product.objects.get(id=product_id, is_active=True)
-            logger.debug(f"Product found: {product.title}")
-            
-            # Рассчитываем цену и количество дней
-            if start_date and end_date:
-                start = datetime.strptime(start_date, '%Y-%m-%d').date()
-                end = datetime.strptime(end_date, '%Y-%m-%d').date()
-                duration_days = (end - start).days + 1
-                # Для товаров с Price auf Anfrage используем 0 как цену
-                if price_per_day and price_per_day > 0:
-                    subtotal = float(price_per_day) * duration_days
-                else:
-                    subtotal = 0.0  # Price auf Anfrage
-            else:
-                # Если нет дат, устанавливаем сегодня + 1 день
-                today = date.today()
-                start_date = today.strftime('%Y-%m-%d')
-                end_date = (today.replace(day=today.day + 1)).strftime('%Y-%m-%d')
-                duration_days = 1
-                # Для товаров с Price auf Anfrage используем 0 как цену
-                if product.price and product.price > 0:
-                    subtotal = float(product.price)
-                    price_per_day = float(product.price)
-                else:
-                    subtotal = 0.0  # Price auf Anfrage
-                    price_per_day = 0.0
-                
-                # Обновляем корзину с датами
-                if cart_key in cart_items:
-                    cart_items[cart_key] = {
-                        'product_id': product_id,
-                        'start_date': start_date,
-                        'end_date': end_date,
-                        'price_per_day': price_per_day
-                    }
-            
-            products.append({
-                'id': product.id,
-                'title': product.title,
-                'price': product.price,
-                'subtotal': subtotal,
-                'start_date': start_date,
-                'end_date': end_date,
-                'duration_days': duration_days,
-                'cart_key': cart_key,
-                'price_per_day': price_per_day,
-                'image': product.image
-            })
-            
-            total_price += float(subtotal)
-            
-        except Product.DoesNotExist:
-            logger.debug(f"Product with id {product_id} does not exist or is not active")
-            continue
-        except Exception as e:
-            logger.debug(f"Error processing cart item: {e}")
-            continue
-    
-    # Очищаем корзину от несуществующих товаров
-    invalid_keys = []
-    for cart_key, cart_data in cart_items.items():
-        if isinstance(cart_data, dict) and 'product_id' in cart_data:
-            try:
-                Product.objects.get(id=cart_data['product_id'], is_active=True)
-            except Product.DoesNotExist:
-                invalid_keys.append(cart_key)
-        elif isinstance(cart_data, str):
-            try:
-                Product.objects.get(id=cart_key, is_active=True)
-            except Product.DoesNotExist:
-                invalid_keys.append(cart_key)
-    
-    # Удаляем несуществующие товары
-    for key in invalid_keys:
-        del cart_items[key]
-        logger.debug(f"Removed invalid item with key: {key}")
-    
-    # Сохраняем обновленную корзину
-    if cart_items:
-        request.session['cart'] = cart_items
-        request.session.modified = True
+    # Товары одним запросом, невалидные записи удаляются из корзины
+    products, total_price = load_cart(request.session)
+    # Доступность всех строк — тоже одним запросом
+    has_conflicts = mark_conflicts(products)
     
     # Рассчитываем стоимость доставки
-    delivery_cost = 70.0 if delivery_option == 'delivery' else 0.0
+    delivery_cost = get_delivery_cost(delivery_option)
     final_total = total_price + delivery_cost
     
     # Получаем данные доставки из сессии
@@ -197,7 +105,6 @@ def cart(request):
         pass
     
     # Отладочная информация
-    logger.debug(f"cart_items = {cart_items}")
     logger.debug(f"products = {products}")
     logger.debug(f"len(products) = {len(products)}")
     logger.debug(f"delivery_address = {delivery_address}")
@@ -212,6 +119,7 @@ def cart(request):
         'delivery_cost': delivery_cost,
         'final_total': final_total,
         'cart_count': len(products),
+        'has_conflicts': has_conflicts,
         'delivery_address': delivery_address,
         'delivery_datetime': delivery_datetime,
         'return_datetime': return_datetime,
@@ -258,41 +166,46 @@ def add_to_cart(request):
             
             if end < start:
                 return JsonResponse({'success': False, 'error': 'End date must be after start date'})
-                
-            # Инициализируем корзину в сессии
-            if 'cart' not in request.session:
-                request.session['cart'] = {}
             
+            error = rental_days_error(start, end)
+            if error:
+                return JsonResponse({'success': False, 'error': error})
+            
+            # Проверяем, свободен ли товар в эти даты
+            busy = find_range_conflicts([(product.id, start, end)])[0]
+            if busy:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'{product.title} ist im gewählten Zeitraum bereits gebucht ({format_ranges(busy)}). Bitte wählen Sie andere Daten.',
+                    'conflicts': [[busy_start.isoformat(), busy_end.isoformat()] for busy_start, busy_end in busy],
+                })
+                
             # Устанавливаем pickup по умолчанию при первом добавлении товара
             if 'delivery_option' not in request.session:
                 request.session['delivery_option'] = 'pickup'
             
-            # Создаем уникальный ключ для товара с датами
-            cart_key = f"{product_id}_{start_date}_{end_date}"
+            # Проверенное количество до добавления (невалидные записи удаляются)
+            cart_count = cached_cart_count(request.session)
             
-            # Добавляем товар в корзину
-            try:
-                price_per_day = float(product.price) if product.price else 0
-            except (ValueError, TypeError) as e:
-                logger.error(f"Price conversion error: {e}, product.price={product.price}")
-                price_per_day = 0
-            
-            cart = request.session['cart']
-            cart[cart_key] = {
-                'product_id': product_id,
-                'start_date': start_date,
-                'end_date': end_date,
-                'price_per_day': price_per_day
-            }
+            if cart_count >= MAX_CART_LINES and find_item(request.session, item_key([product.id, start.toordinal(), end.toordinal(), None])) is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Der Warenkorb kann höchstens {MAX_CART_LINES} Positionen enthalten.',
+                })
+            
+            # Добавляем товар в корзину (тот же товар на те же даты заменяется)
+            if add_item(request.session, product.id, start, end, product.price):
+                cart_count += 1
+            store_cart_count(request.session, cart_count)
                 
             request.session.modified = True
             
-            logger.debug(f"Product added to cart: {product.title}, cart_key={cart_key}")
+            logger.debug(f"Product added to cart: {product.title}, {start} - {end}")
             
             return JsonResponse({
                 'success': True,
                 'message': f'{product.title} wurde in den Warenkorb gelegt',
-                'cart_count': len(cart)
+                'cart_count': cart_count
             })
             
         except json.JSONDecodeError as e:
@@ -315,14 +228,15 @@ def remove_from_cart(request):
             if not cart_key:
                 return JsonResponse({'success': False, 'error': 'Cart key is required'})
             
-            cart = request.session.get('cart', {})
-            if cart_key in cart:
-                del cart[cart_key]
+            cart_count = cached_cart_count(request.session)
+            if remove_item(request.session, cart_key):
+                cart_count = max(cart_count - 1, 0)
+                store_cart_count(request.session, cart_count)
                 request.session.modified = True
                 
                 # Если корзина пуста, сбрасываем способ доставки на pickup
                 # Детали доставки очищаем только при полной очистке корзины
-                if not cart:
+                if not get_items(request.session):
                     request.session['delivery_option'] = 'pickup'
                     # Очищаем детали доставки только если корзина полностью пуста
                     if 'delivery_address' in request.session:
@@ -338,7 +252,7 @@ def remove_from_cart(request):
                 return JsonResponse({
                     'success': True,
                     'message': 'Produkt wurde aus dem Warenkorb entfernt',
-                    'cart_count': len(cart)
+                    'cart_count': cart_count
                 })
             
         except Exception as e:
@@ -365,23 +279,31 @@ def update_cart_dates(request):
             
             if end < start:
                 return JsonResponse({'success': False, 'error': 'End date must be after start date'})
-                
-            cart = request.session.get('cart', {})
-            if cart_key in cart:
-                # Обновляем даты
-                cart[cart_key]['start_date'] = start_date
-                cart[cart_key]['end_date'] = end_date
-                request.session.modified = True
-                        
+            
+            error = rental_days_error(start, end)
+            if error:
+                return JsonResponse({'success': False, 'error': error})
+            
+            item = find_item(request.session, cart_key)
+            if item is not None:
+                # Проверяем, свободен ли товар в новые даты
+                busy = find_range_conflicts([(item[0], start, end)])[0]
+                if busy:
+                    return JsonResponse({
+                        'success': False,
+                        'error': f'Das Produkt ist im gewählten Zeitraum bereits gebucht ({format_ranges(busy)}). Bitte wählen Sie andere Daten.',
+                        'conflicts': [[busy_start.isoformat(), busy_end.isoformat()] for busy_start, busy_end in busy],
+                    })
+                item = update_item_dates(request.session, cart_key, start, end)
+
                 # Пересчитываем цену
                 duration_days = (end - start).days + 1
-                price_per_day = cart[cart_key]['price_per_day']
-                new_subtotal = price_per_day * duration_days
+                new_subtotal = item_subtotal(item)
             
                 return JsonResponse({
                     'success': True,
                     'message': 'Daten wurden aktualisiert',
-                    'new_subtotal': new_subtotal,
+                    'new_subtotal': float(new_subtotal),
                     'duration_days': duration_days
                 })
             else:
@@ -411,31 +333,16 @@ def update_delivery_option(request):
             # Пользователь может сохранить детали и использовать их позже
             # Детали будут очищены только при очистке корзины или отправке заявки
             
-            # Рассчитываем новую стоимость
-            cart_items = request.session.get('cart', {})
-            total_price = 0.0
-            
-            for cart_key, cart_data in cart_items.items():
-                if isinstance(cart_data, dict):
-                    start_date = cart_data.get('start_date')
-                    end_date = cart_data.get('end_date')
-                    price_per_day = cart_data.get('price_per_day', 0)
-                    
-                    if start_date and end_date and price_per_day:
-                        start = datetime.strptime(start_date, '%Y-%m-%d').date()
-                        end = datetime.strptime(end_date, '%Y-%m-%d').date()
-                        duration_days = (end - start).days + 1
-                        subtotal = float(price_per_day) * duration_days
-                        total_price += subtotal
-            
-            delivery_cost = 70.0 if delivery_option == 'delivery' else 0.0
+            # Рассчитываем новую стоимость (по ценам из корзины, без запросов к БД)
+            total_price = rental_total(get_items(request.session))
+            delivery_cost = get_delivery_cost(delivery_option)
             final_total = total_price + delivery_cost
             
             return JsonResponse({
                 'success': True,
                 'message': 'Lieferoption wurde aktualisiert',
-                'delivery_cost': delivery_cost,
-                'final_total': final_total
+                'delivery_cost': float(delivery_cost),
+                'final_total': float(final_total)
             })
             
         except Exception as e:
@@ -444,6 +351,41 @@ def update_delivery_option(request):
     return JsonResponse({'success': False, 'error': 'Method not allowed'})
 
 
+class CartOperationError(Exception):
+    """Изменение корзины отклонено; текст — сообщение для клиента"""
+
+    def __init__(self, message, conflicts=None):
+        super().__init__(message)
+        self.conflicts = conflicts
+
+
+DELIVERY_DETAIL_KEYS = ('delivery_address', 'delivery_datetime', 'return_datetime', 'delivery_instructions')
+
+
+def clean_delivery_details(data):
+    """Проверяет детали доставки; возвращает словарь для сессии или бросает CartOperationError"""
+    details = {key: (data.get(key) or '').strip() for key in DELIVERY_DETAIL_KEYS}
+    
+    # Валидация обязательных полей
+    if not details['delivery_address']:
+        raise CartOperationError('Lieferadresse ist erforderlich')
+    if not details['delivery_datetime']:
+        raise CartOperationError('Lieferdatum und -zeit sind erforderlich')
+    if not details['return_datetime']:
+        raise CartOperationError('Rückgabedatum und -zeit sind erforderlich')
+    
+    # Проверяем, что время возврата после времени доставки
+    try:
+        delivery_dt = datetime.strptime(details['delivery_datetime'], '%Y-%m-%dT%H:%M')
+        return_dt = datetime.strptime(details['return_datetime'], '%Y-%m-%dT%H:%M')
+    except ValueError:
+        raise CartOperationError('Ungültiges Datums- oder Zeitformat')
+    if return_dt <= delivery_dt:
+        raise CartOperationError('Rückgabezeit muss nach der Lieferzeit liegen')
+    
+    return details
+
+
 def update_delivery_details(request):
     """Обновление деталей доставки (адрес, даты, время)"""
     if request.method == 'POST':
@@ -454,36 +396,13 @@ def update_delivery_details(request):
             if request.session.get('delivery_option') != 'delivery':
                 return JsonResponse({'success': False, 'error': 'Lieferung muss ausgewählt werden'})
             
-            # Получаем данные доставки
-            delivery_address = data.get('delivery_address', '').strip()
-            delivery_datetime = data.get('delivery_datetime', '').strip()
-            return_datetime = data.get('return_datetime', '').strip()
-            delivery_instructions = data.get('delivery_instructions', '').strip()
-            
-            # Валидация обязательных полей
-            if not delivery_address:
-                return JsonResponse({'success': False, 'error': 'Lieferadresse ist erforderlich'})
-            if not delivery_datetime:
-                return JsonResponse({'success': False, 'error': 'Lieferdatum und -zeit sind erforderlich'})
-            if not return_datetime:
-                return JsonResponse({'success': False, 'error': 'Rückgabedatum und -zeit sind erforderlich'})
-            
-            # Проверяем, что время возврата после времени доставки
             try:
-                delivery_dt = datetime.strptime(delivery_datetime, '%Y-%m-%dT%H:%M')
-                return_dt = datetime.strptime(return_datetime, '%Y-%m-%dT%H:%M')
-                
-                if return_dt <= delivery_dt:
-                    return JsonResponse({'success': False, 'error': 'Rückgabezeit muss nach der Lieferzeit liegen'})
-                    
-            except ValueError:
-                return JsonResponse({'success': False, 'error': 'Ungültiges Datums- oder Zeitformat'})
+                details = clean_delivery_details(data)
+            except CartOperationError as e:
+                return JsonResponse({'success': False, 'error': str(e)})
             
             # Сохраняем в сессии
-            request.session['delivery_address'] = delivery_address
-            request.session['delivery_datetime'] = delivery_datetime
-            request.session['return_datetime'] = return_datetime
-            request.session['delivery_instructions'] = delivery_instructions
+            request.session.update(details)
             request.session.modified = True
             
             return JsonResponse({
@@ -497,6 +416,165 @@ def update_delivery_details(request):
     return JsonResponse({'success': False, 'error': 'Method not allowed'})
 
 
+def _apply_cart_operation(operation, items, state):
+    """Применяет одну операцию к копии корзины; возвращает (строка с новыми датами или None, удалено строк)"""
+    op = operation.get('op')
+    
+    if op == 'update_dates':
+        try:
+            start = datetime.strptime(operation.get('start_date') or '', '%Y-%m-%d').date()
+            end = datetime.strptime(operation.get('end_date') or '', '%Y-%m-%d').date()
+        except ValueError:
+            raise CartOperationError('Ungültiges Datum')
+        if end < start:
+            raise CartOperationError('End date must be after start date')
+        error = rental_days_error(start, end)
+        if error:
+            raise CartOperationError(error)
+        for item in items:
+            if item_key(item) == operation.get('cart_key'):
+                item[1], item[2] = start.toordinal(), end.toordinal()
+                return item, 0
+        raise CartOperationError('Cart item not found')
+    
+    if op == 'remove':
+        remaining = [item for item in items if item_key(item) != operation.get('cart_key')]
+        removed = len(items) - len(remaining)
+        if not removed:
+            raise CartOperationError('Cart item not found')
+        items[:] = remaining
+        return None, removed
+    
+    if op == 'delivery_option':
+        if operation.get('delivery_option') not in ('pickup', 'delivery'):
+            raise CartOperationError('Invalid delivery option')
+        state['delivery_option'] = operation['delivery_option']
+        return None, 0
+    
+    if op == 'delivery_details':
+        # Способ доставки может быть выбран предыдущей операцией того же пакета
+        if state['delivery_option'] != 'delivery':
+            raise CartOperationError('Lieferung muss ausgewählt werden')
+        state.update(clean_delivery_details(operation))
+        return None, 0
+    
+    raise CartOperationError(f'Unknown operation: {op}')
+
+
+def update_cart_batch(request):
+    """Несколько изменений корзины одним запросом (страница корзины)
+
+    {"operations": [{"op": "update_dates", "cart_key", "start_date", "end_date"},
+                    {"op": "remove", "cart_key"},
+                    {"op": "delivery_option", "delivery_option"},
+                    {"op": "delivery_details", "delivery_address", ...}]}
+
+    Операции применяются по порядку к копии корзины; новые даты всех строк
+    проверяются одним запросом. Если хоть одна операция отклонена, сессия не
+    меняется. Ответ — пересчитанные строки и суммы, один раз на весь пакет.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'})
+    
+    try:
+        data = json.loads(request.body)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': f'Invalid JSON: {str(e)}'})
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'success': False, 'error': 'Operations are required'})
+    
+    cart_count = cached_cart_count(request.session)
+    items = [list(item) for item in get_items(request.session)]
+    state = {key: request.session[key] for key in DELIVERY_DETAIL_KEYS if key in request.session}
+    state['delivery_option'] = request.session.get('delivery_option', 'pickup')
+    
+    moved = []
+    removed = 0
+    for index, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict):
+                raise CartOperationError('Invalid operation')
+            item, removed_now = _apply_cart_operation(operation, items, state)
+        except CartOperationError as e:
+            return JsonResponse({'success': False, 'error': str(e), 'operation': index})
+        if item is not None and all(item is not other for other in moved):
+            moved.append(item)
+        removed += removed_now
+    
+    # Проверяем, свободны ли товары в новые даты — один запрос на все строки
+    moved = [item for item in moved if any(item is other for other in items)]
+    if moved:
+        ranges = [(item[0], date.fromordinal(item[1]), date.fromordinal(item[2])) for item in moved]
+        for item, busy in zip(moved, find_range_conflicts(ranges)):
+            if busy:
+                product_title = Product.objects.filter(id=item[0]).values_list('title', flat=True).first() or 'Das Produkt'
+                return JsonResponse({
+                    'success': False,
+                    'error': f'{product_title} ist im gewählten Zeitraum bereits gebucht ({format_ranges(busy)}). Bitte wählen Sie andere Daten.',
+                    'conflicts': [[busy_start.isoformat(), busy_end.isoformat()] for busy_start, busy_end in busy],
+                })
+    
+    # Все операции приняты — записываем корзину и доставку в сессию одним изменением
+    save_items(request.session, items)
+    if not items:
+        # Как в remove_from_cart: пустая корзина — pickup без деталей доставки
+        state = {'delivery_option': 'pickup'}
+        for key in DELIVERY_DETAIL_KEYS:
+            request.session.pop(key, None)
+    request.session.update(state)
+    cart_count = max(cart_count - removed, 0)
+    store_cart_count(request.session, cart_count)
+    
+    total_price = rental_total(items)
+    delivery_cost = get_delivery_cost(state['delivery_option'])
+    return JsonResponse({
+        'success': True,
+        'message': 'Warenkorb wurde aktualisiert',
+        'cart_count': cart_count,
+        'items': [
+            {
+                'cart_key': item_key(item),
+                'start_date': date.fromordinal(item[1]).isoformat(),
+                'end_date': date.fromordinal(item[2]).isoformat(),
+                'duration_days': item[2] - item[1] + 1,
+                'subtotal': float(item_subtotal(item)),
+            }
+            for item in items
+        ],
+        'total_price': float(total_price),
+        'delivery_cost': float(delivery_cost),
+        'final_total': float(total_price + delivery_cost),
+    })
+
+
+def _unavailable_response(lines):
+    unavailable = ', '.join(line['title'] for line in lines if line['conflicts'])
+    return JsonResponse({
+        'success': False,
+        'error': f'Im gewählten Zeitraum bereits gebucht: {unavailable}. Bitte ändern Sie die Daten.'
+    })
+
+
+def _inquiry_notes(comment, delivery_option, session):
+    """Заметка к броням из заявки: комментарий клиента и доставка"""
+    notes = ['Anfrage über die Website']
+    if comment:
+        notes.append(f"Kommentar: {comment}")
+    if delivery_option == 'delivery':
+        notes.append('Lieferung + Aufbau/Abbau')
+        if session.get('delivery_address'):
+            notes.append(f"Adresse: {session['delivery_address']}")
+        if session.get('delivery_datetime'):
+            notes.append(f"Lieferung: {format_datetime_dmy(session['delivery_datetime'])}")
+        if session.get('return_datetime'):
+            notes.append(f"Rückgabe: {format_datetime_dmy(session['return_datetime'])}")
+    else:
+        notes.append('Selbstabholung')
+    return '\n'.join(notes)
+
+
+@idempotent('inquiry')
 def send_inquiry(request):
     """Отправка заявки на email"""
     if request.method == 'POST':
@@ -525,51 +603,7 @@ def send_inquiry(request):
                 })
             
             # Получаем товары из корзины
-            cart_items = request.session.get('cart', {})
-            products = []
-            total_price = 0.0
-            
-            for cart_key, cart_data in cart_items.items():
-                try:
-                    # Проверяем, является ли это новым форматом корзины с датами
-                    if isinstance(cart_data, dict):
-                        product_id = cart_data['product_id']
-                        start_date = cart_data.get('start_date')
-                        end_date = cart_data.get('end_date')
-                        price_per_day = cart_data.get('price_per_day', 0)
-                    else:
-                        # Старый формат (только product_id и quantity)
-                        product_id = cart_key
-                        start_date = None
-                        end_date = None
-                        price_per_day = 0
-                    
-                    product = Product.objects.get(id=product_id, is_active=True)
-                    
-                    # Рассчитываем цену
-                    if start_date and end_date and price_per_day:
-                        # Новый формат с датами
-                        start = datetime.strptime(start_date, '%Y-%m-%d').date()
-                        end = datetime.strptime(end_date, '%Y-%m-%d').date()
-                        duration_days = (end - start).days + 1
-                        subtotal = float(price_per_day) * duration_days
-                    else:
-                        # Старый формат без дат
-                        subtotal = float(product.price) if product.price else 0.0
-                    
-                    products.append({
-                        'title': product.title,
-                        'price': product.price,
-                        'subtotal': subtotal,
-                        'start_date': start_date,
-                        'end_date': end_date,
-                        'duration_days': duration_days if start_date and end_date else 1
-                    })
-                    
-                    total_price += float(subtotal)
-                    
-                except Product.DoesNotExist:
-                    continue
+            products, total_price = load_cart(request.session)
             
             if not products:
                 return JsonResponse({
@@ -577,6 +611,18 @@ def send_inquiry(request):
                     'error': 'Warenkorb ist leer'
                 })
             
+            # Заявка сразу создаёт блокирующие брони — длина аренды и число строк ограничены
+            error = inquiry_limit_error(products)
+            if error:
+                return JsonResponse({'success': False, 'error': error})
+            
+            # Заявки на занятые даты не отправляем — клиент сначала меняет даты
+            if mark_conflicts(products):
+                return _unavailable_response(products)
+            
+            # Номер заявки: им связаны созданные брони, он же в письме администратору
+            inquiry_id = uuid.uuid4()
+            
             # Формируем сообщение с безопасным кодированием
             def safe_encode(text):
                 if text:
@@ -593,6 +639,7 @@ def send_inquiry(request):
             
             message = f"""
 Neue Anfrage von der Play & Jump Website
+Anfrage-Nr.: {inquiry_id} (als ausstehende Buchungen angelegt)
 
 Kunde: {customer_name_safe}
 Email: {customer_email_safe}
@@ -606,8 +653,8 @@ Ausgewählte Produkte:
             
             for product in products:
                 if product.get('start_date') and product.get('end_date'):
-                    start_date_formatted = format_date_dmy(product['start_date'])
-                    end_date_formatted = format_date_dmy(product['end_date'])
+                    start_date_formatted = product['start'].strftime('%d-%m-%Y')
+                    end_date_formatted = product['end'].strftime('%d-%m-%Y')
                     subtotal_formatted = format_price(product['subtotal'])
                     message += f"- {product['title']} ({start_date_formatted} bis {end_date_formatted}, {product['duration_days']} Tage) = {subtotal_formatted}€\n"
                 else:
@@ -616,8 +663,7 @@ Ausgewählte Produkte:
             
             # Добавляем информацию о доставке
             delivery_option = request.session.get('delivery_option', 'pickup')
-            delivery_cost = 70.0 if delivery_option == 'delivery' else 0.0
-            total_price = sum(product['subtotal'] for product in products)
+            delivery_cost = get_delivery_cost(delivery_option)
             final_total = total_price + delivery_cost
             
             message += f"\nMietpreis: {format_price(total_price)}€"
@@ -644,18 +690,7 @@ Ausgewählte Produkte:
                 
             message += f"\nGesamt: {format_price(final_total)}€"
             
-            # Отправляем email администратору
             try:
-                email = EmailMessage(
-                    subject='Neue Anfrage von der Play & Jump Website',
-                    body=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=['playandjump.de@gmail.com'],
-                )
-                email.content_subtype = 'plain'
-                email.encoding = 'utf-8'
-                email.send(fail_silently=False)
-                
                 # Автоответ клиенту (корпоративное письмо: plain + HTML)
                 if customer_email:
                     from html import escape as html_escape
@@ -665,8 +700,8 @@ Ausgewählte Produkte:
                     product_lines_html = []
                     for product in products:
                         if product.get('start_date') and product.get('end_date'):
-                            start_f = format_date_dmy(product['start_date'])
-                            end_f = format_date_dmy(product['end_date'])
+                            start_f = product['start'].strftime('%d-%m-%Y')
+                            end_f = product['end'].strftime('%d-%m-%Y')
                             sub_f = format_price(product['subtotal'])
                             product_lines_plain.append(f"  • {product['title']} ({start_f} bis {end_f}, {product['duration_days']} Tag(e)) = {sub_f} €")
                             product_lines_html.append(f"<li>{html_escape(product['title'])} ({start_f} bis {end_f}, {product['duration_days']} Tag(e)) = {sub_f} €</li>")
@@ -736,18 +771,45 @@ www.playandjump.de
 </div>
 </body>
 </html>"""
-                    confirmation_email = EmailMultiAlternatives(
-                        subject='Ihre Buchungsanfrage bei Play & Jump – wir haben sie erhalten',
-                        body=confirmation_message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        to=[customer_email],
+                
+                result = {
+                    'success': True,
+                    'inquiry_id': str(inquiry_id),
+                    'message': 'Anfrage erfolgreich gesendet! Wir werden uns in Kürze bei Ihnen melden.'
+                }
+                # Брони, письма администратору и клиенту и ответ для повторов
+                # (Idempotency-Key) — в одной транзакции; письма отправит drain_outbox
+                with transaction.atomic():
+                    bookings, conflicting = book_cart(
+                        products,
+                        inquiry_id,
+                        customer_name or customer_email or customer_phone,
+                        customer_email,
+                        customer_phone,
+                        notes=_inquiry_notes(comment, delivery_option, request.session),
+                    )
+                    if conflicting:
+                        # Даты заняли, пока клиент заполнял форму
+                        return _unavailable_response(conflicting)
+                    queue_email(
+                        'inquiry',
+                        'Neue Anfrage von der Play & Jump Website',
+                        message,
+                        ['playandjump.de@gmail.com'],
                     )
-                    confirmation_email.attach_alternative(html_body, 'text/html')
-                    confirmation_email.encoding = 'utf-8'
-                    confirmation_email.send(fail_silently=True)
+                    if customer_email:
+                        queue_email(
+                            'confirmation',
+                            'Ihre Buchungsanfrage bei Play & Jump – wir haben sie erhalten',
+                            confirmation_message,
+                            [customer_email],
+                            html_body=html_body,
+                        )
+                    complete(request, result)
                 
-                # Очищаем корзину и данные доставки только при успешной отправке заявки
-                request.session['cart'] = {}
+                # Очищаем корзину и данные доставки только при успешной постановке заявки
+                save_items(request.session, [])
+                store_cart_count(request.session, 0)
                 # Сбрасываем на pickup по умолчанию
                 request.session['delivery_option'] = 'pickup'
                 # Очищаем детали доставки
@@ -761,12 +823,10 @@ www.playandjump.de
                     del request.session['delivery_instructions']
                 request.session.modified = True
             
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Anfrage erfolgreich gesendet! Wir werden uns in Kürze bei Ihnen melden.'
-                })
+                return JsonResponse(result)
                 
             except Exception as e:
+                logger.error(f"Error queueing inquiry emails: {e}", exc_info=True)
                 return JsonResponse({
                     'success': False,
                     'error': f'Fehler beim Senden der E-Mail: {str(e)}'
@@ -783,40 +843,12 @@ www.playandjump.de
 
 def cart_count(request):
     """Получение количества товаров в корзине"""
-    cart_items = request.session.get('cart', {})
-    
-    # Подсчитываем только валидные товары (с product_id)
-    valid_count = 0
-    invalid_keys = []
+    # Считаем только валидные товары, несуществующие удаляются из корзины
+    products, _ = load_cart(request.session)
     
-    for cart_key, cart_data in cart_items.items():
-        if isinstance(cart_data, dict) and 'product_id' in cart_data:
-            try:
-                # Проверяем, существует ли товар
-                product = Product.objects.get(id=cart_data['product_id'], is_active=True)
-                valid_count += 1
-            except Product.DoesNotExist:
-                invalid_keys.append(cart_key)
-        elif isinstance(cart_data, str):  # Старый формат
-            try:
-                product = Product.objects.get(id=cart_key, is_active=True)
-                valid_count += 1
-            except Product.DoesNotExist:
-                invalid_keys.append(cart_key)
+    logger.debug(f"valid_count = {len(products)}")
     
-    # Удаляем несуществующие товары из корзины
-    if invalid_keys:
-        for key in invalid_keys:
-            del cart_items[key]
-        request.session['cart'] = cart_items
-        request.session.modified = True
-        logger.debug(f"Removed invalid items: {invalid_keys}")
-    
-    # Отладочная информация
-    logger.debug(f"cart_items = {cart_items}")
-    logger.debug(f"valid_count = {valid_count}")
-    
-    return JsonResponse({'count': valid_count})
+    return JsonResponse({'count': len(products)})
 
 
 def kontakt(request):
@@ -850,6 +882,7 @@ def cookie_richtlinie(request):
     return render(request, 'main/cookie_richtlinie.html')
 
 
+@idempotent('contact')
 def send_contact(request):
     """Отправка сообщения через контактную форму"""
     if request.method == 'POST':
@@ -862,9 +895,6 @@ def send_contact(request):
             phone = data.get('phone', '').strip()
             message = data.get('message', '').strip()
             
-            # Сохраняем оригинальные данные с немецкими символами
-            # Заменяем символы только в email тексте для Windows консоли
-            
             # Валидация
             if not email:
                 return JsonResponse({
@@ -883,19 +913,6 @@ def send_contact(request):
             if not full_name:
                 full_name = "Unbekannt"
             
-            # Функция для замены символов только для Windows консоли
-            def console_safe(text):
-                if text:
-                    replacements = {
-                        'ü': 'ue', 'Ü': 'Ue',
-                        'ö': 'oe', 'Ö': 'Oe', 
-                        'ä': 'ae', 'Ä': 'Ae',
-                        'ß': 'ss'
-                    }
-                    for old, new in replacements.items():
-                        text = text.replace(old, new)
-                return text
-            
             # Формируем текст письма с оригинальными символами
             email_subject = f"Neue Kontaktanfrage von {full_name}"
             email_body = f"""
@@ -912,30 +929,17 @@ Nachricht:
 Diese Nachricht wurde über das Kontaktformular auf playandjump.de gesendet.
 """
             
-            # Отправляем email на правильный адрес
-            try:
-                send_mail(
-                    subject=email_subject,
-                    message=email_body,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=['playandjump.de@gmail.com'],
-                    fail_silently=False,
-                )
-            except UnicodeEncodeError:
-                # Если ошибка кодировки, используем безопасную версию для консоли
-                logger.warning("Unicode encoding error, using console-safe version")
-                send_mail(
-                    subject=console_safe(email_subject),
-                    message=console_safe(email_body),
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=['playandjump.de@gmail.com'],
-                    fail_silently=False,
-                )
-            
-            return JsonResponse({
+            result = {
                 'success': True,
                 'message': 'Ihre Nachricht wurde erfolgreich gesendet!'
-            })
+            }
+            # Письмо уходит через очередь (drain_outbox), ответ не ждёт SMTP;
+            # ответ для повторов записывается вместе с письмом
+            with transaction.atomic():
+                queue_email('contact', email_subject, email_body, ['playandjump.de@gmail.com'])
+                complete(request, result)
+            
+            return JsonResponse(result)
             
         except Exception as e:
             logger.error(f"Error sending contact form: {e}")
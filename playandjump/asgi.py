@@ -1,5 +1,8 @@
 """
 ASGI config for playandjump project.
+
+Push-обновления календаря броней (catalog:booking_event_stream, SSE) работают
+только под ASGI-сервером, например: uvicorn playandjump.asgi:application
 """
 
 import os
@@ -149,13 +149,11 @@ CACHES = {
     }
 }
 
-# Sessions - используем файловое хранилище вместо базы данных
-# Это решает проблему блокировки SQLite при одновременных запросах
-SESSION_ENGINE = 'django.contrib.sessions.backends.file'
-# Путь для хранения файлов сессий
-SESSION_FILE_PATH = str(BASE_DIR / 'sessions')
-# Создаем папку для сессий, если её нет (безопасный способ)
-os.makedirs(SESSION_FILE_PATH, exist_ok=True)
+# Sessions - отдельный файл SQLite в режиме WAL (не блокирует основную базу,
+# не пишет сессию, если она не изменилась). Просроченные сессии удаляет
+# `python manage.py clearsessions` (ежедневная задача по расписанию).
+SESSION_ENGINE = 'playandjump.sqlite_sessions'
+SESSION_SQLITE_PATH = str(BASE_DIR / 'sessions.sqlite3')
 
 # Email settings для PythonAnywhere
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -0,0 +1,152 @@
+"""Хранилище сессий в отдельном файле SQLite в режиме WAL.
+
+Замена файловым сессиям для корзины: AJAX-запросы корзины часто читают и пишут
+сессию параллельно. Отдельный файл не конкурирует за блокировку с основной базой,
+WAL позволяет читать во время записи, а каждая запись — одна короткая команда
+в режиме autocommit. Если данные сессии не изменились, запись пропускается;
+срок жизни при этом продлевается не чаще раза в SESSION_SQLITE_REFRESH_SECONDS.
+
+Подключение: SESSION_ENGINE = 'playandjump.sqlite_sessions',
+путь к файлу — SESSION_SQLITE_PATH (по умолчанию BASE_DIR / 'sessions.sqlite3').
+Просроченные сессии удаляет стандартная команда `manage.py clearsessions`.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+
+# Удаление просроченных сессий порциями, чтобы не держать блокировку записи
+SWEEP_BATCH_SIZE = 1000
+
+_local = threading.local()
+
+
+def _database_path():
+    return str(getattr(settings, 'SESSION_SQLITE_PATH', None) or os.path.join(settings.BASE_DIR, 'sessions.sqlite3'))
+
+
+def get_connection():
+    """Соединение на поток (и процесс — после fork соединение открывается заново)"""
+    path = _database_path()
+    key = (os.getpid(), path)
+    connection = getattr(_local, 'connections', {}).get(key)
+    if connection is None:
+        connection = sqlite3.connect(path, timeout=20, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS session ('
+            'session_key TEXT PRIMARY KEY, '
+            'session_data TEXT NOT NULL, '
+            'expire_date INTEGER NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS session_expire_idx ON session (expire_date)')
+        _local.connections = {key: connection}
+    return connection
+
+
+class SessionStore(SessionBase):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Что лежит в базе сейчас: по этому решаем, нужна ли запись. Сравниваем
+        # сериализованный словарь, а не session_data — подпись в нём меняется каждую секунду
+        self._stored_state = None
+        self._stored_expire = None
+
+    def load(self):
+        row = None
+        if self.session_key is not None:
+            row = get_connection().execute(
+                'SELECT session_data, expire_date FROM session WHERE session_key = ? AND expire_date > ?',
+                (self.session_key, int(time.time())),
+            ).fetchone()
+        if row is None:
+            self._session_key = None
+            return {}
+        session_data, self._stored_expire = row
+        session = self.decode(session_data)
+        self._stored_state = self._state(session)
+        return session
+
+    def _state(self, session):
+        return self.serializer().dumps(session)
+
+    def exists(self, session_key):
+        return get_connection().execute(
+            'SELECT 1 FROM session WHERE session_key = ?', (session_key,)
+        ).fetchone() is not None
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                # Ключ уже занят — пробуем другой
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        session = self._get_session(no_load=must_create)
+        state = self._state(session)
+        expire = int(self.get_expiry_date().timestamp())
+        connection = get_connection()
+
+        if must_create:
+            data = self.encode(session)
+            try:
+                connection.execute(
+                    'INSERT INTO session (session_key, session_data, expire_date) VALUES (?, ?, ?)',
+                    (self.session_key, data, expire),
+                )
+            except sqlite3.IntegrityError:
+                raise CreateError
+        else:
+            refresh = getattr(settings, 'SESSION_SQLITE_REFRESH_SECONDS', 3600)
+            if (
+                state == self._stored_state
+                and self._stored_expire is not None
+                and expire - self._stored_expire < refresh
+            ):
+                # Ничего не изменилось (views часто ставят modified = True на всякий случай)
+                return
+            data = self.encode(session)
+            updated = connection.execute(
+                'UPDATE session SET session_data = ?, expire_date = ? WHERE session_key = ?',
+                (data, expire, self.session_key),
+            ).rowcount
+            if not updated:
+                # Сессию удалили параллельно (выход, очистка)
+                raise UpdateError
+
+        self._stored_state, self._stored_expire = state, expire
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        get_connection().execute('DELETE FROM session WHERE session_key = ?', (session_key,))
+
+    @classmethod
+    def clear_expired(cls):
+        """Удаляет просроченные сессии по индексу expire_date; возвращает количество"""
+        connection = get_connection()
+        now = int(time.time())
+        removed = 0
+        while True:
+            deleted = connection.execute(
+                'DELETE FROM session WHERE session_key IN ('
+                'SELECT session_key FROM session WHERE expire_date <= ? LIMIT ?)',
+                (now, SWEEP_BATCH_SIZE),
+            ).rowcount
+            removed += deleted
+            if deleted < SWEEP_BATCH_SIZE:
+                return removed
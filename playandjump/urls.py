@@ -8,6 +8,7 @@ from django.conf.urls.static import static
 from django.http import HttpResponse
 from django.views.generic import TemplateView
 from django.shortcuts import redirect
+from catalog.views import resized_image
 
 def robots_txt(request):
     return HttpResponse("User-agent: *\nAllow: /\n\nSitemap: https://www.playandjump.de/sitemap.xml", content_type="text/plain")
@@ -28,4 +29,6 @@ urlpatterns = [
     path('stockfangen/', redirect_old_pages),
     path('huepfburg-polizei/', redirect_old_pages),
     path('fussball-darts/', redirect_old_pages),
+    # Уменьшенные копии по запросу; не под /media/ — там на хостинге статическое отображение
+    path('img/r/<int:width>x<int:height>/<path:name>', resized_image, name='resized_image'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) 
\ No newline at end of file